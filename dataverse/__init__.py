@@ -1 +1,18 @@
-from .api import DataverseAPI, DataverseSession
+import importlib
+
+# names are imported on first use, so importing the package does not load requests, msal or pandas
+_EXPORTS = {
+    'DataverseAPI': '.api',
+    'DataverseSession': '.sessions',
+    'MutateResult': '.results',
+    'SessionPool': '.pool'
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
\ No newline at end of file
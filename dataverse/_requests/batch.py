@@ -0,0 +1,53 @@
+from .. import encoding
+
+def build_batch_body(boundary: str, operations: list) -> bytes:
+    """
+    Builds a multipart $batch body from (method, uri, payload) operations.
+    Operations without a payload are sent without a body.
+    """
+    parts = []
+    for method, uri, payload in operations:
+        part = (f'--{boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                'Content-Transfer-Encoding: binary\r\n\r\n'
+                f'{method} {uri} HTTP/1.1\r\n').encode('utf-8')
+        if payload is None:
+            part += b'\r\n'
+        else:
+            part += b'Content-Type: application/json\r\n\r\n' + encoding.dumps(payload) + b'\r\n'
+        parts.append(part)
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts)
+
+def get_boundary(content_type: str) -> str:
+    """
+    Extracts the multipart boundary from a Content-Type header.
+    """
+    for parameter in content_type.split(';'):
+        name, _, value = parameter.strip().partition('=')
+        if name == 'boundary':
+            return value.strip('"')
+    raise ValueError(f"No boundary found in Content-Type '{content_type}'.")
+
+def parse_batch_response(content_type: str, content: bytes) -> list:
+    """
+    Splits a $batch response into one dict per operation with its status_code, headers and body.
+    """
+    boundary = get_boundary(content_type)
+    text = content.decode('utf-8').replace('\r\n', '\n')
+
+    results = []
+    for part in text.split(f'--{boundary}')[1:]:
+        if part.startswith('--'):
+            break
+        # skip the part headers, then read the embedded HTTP response
+        http = part.split('\n\n', 1)[1]
+        status_line, _, rest = http.partition('\n')
+        header_lines, _, body = rest.partition('\n\n')
+        headers = dict(line.split(': ', 1) for line in header_lines.split('\n') if ': ' in line)
+        results.append({
+            'status_code': int(status_line.split(' ')[1]),
+            'headers': headers,
+            'body': body.strip()
+        })
+    return results
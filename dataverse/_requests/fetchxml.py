@@ -0,0 +1,109 @@
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+PAGING_COOKIE_ANNOTATION = '@Microsoft.Dynamics.CRM.fetchxmlpagingcookie'
+MORE_RECORDS_ANNOTATION = '@Microsoft.Dynamics.CRM.morerecords'
+PREFER_PAGING_ANNOTATIONS = 'odata.include-annotations="Microsoft.Dynamics.CRM.fetchxmlpagingcookie,Microsoft.Dynamics.CRM.morerecords"'
+
+def set_paging(fetch_xml: str, page: int, count: int, paging_cookie: str = None) -> str:
+    """
+    Returns the FetchXML with the page, count and paging-cookie attributes of the fetch element set.
+    """
+    fetch = ET.fromstring(fetch_xml)
+    fetch.set('page', str(page))
+    fetch.set('count', str(count))
+    if paging_cookie is not None:
+        fetch.set('paging-cookie', paging_cookie)
+    return ET.tostring(fetch, encoding='unicode')
+
+def get_paging_cookie(annotation: str) -> str:
+    """
+    Extracts the paging cookie to send with the next page from the fetchxmlpagingcookie annotation.
+    The server returns it double URL-encoded inside the pagingcookie attribute of a cookie element.
+    """
+    cookie = ET.fromstring(annotation).get('pagingcookie')
+    if cookie is None:
+        return None
+    return urllib.parse.unquote(urllib.parse.unquote(cookie))
+
+def get_entity_name(fetch_xml: str) -> str:
+    """
+    Returns the logical name of the entity a FetchXML query reads from.
+    """
+    return ET.fromstring(fetch_xml).find('entity').get('name')
+
+def has_conditions(fetch_xml: str) -> bool:
+    """
+    Returns whether a FetchXML query filters its rows, on its entity or any linked entity.
+    """
+    return ET.fromstring(fetch_xml).find('.//condition') is not None
+
+def get_top(fetch_xml: str):
+    """
+    Returns the row limit set by the top attribute of the fetch element, or None.
+    """
+    top = ET.fromstring(fetch_xml).get('top')
+    return int(top) if top is not None else None
+
+# OData aggregation methods and the FetchXML aggregate each maps to
+FETCH_AGGREGATES = {
+    'sum': 'sum',
+    'average': 'avg',
+    'min': 'min',
+    'max': 'max',
+    'count': 'count',
+    'countcolumn': 'countcolumn'
+}
+
+FETCH_FUNCTIONS = {
+    'contains': '%{}%',
+    'startswith': '{}%',
+    'endswith': '%{}'
+}
+
+def build_condition(parent: ET.Element, attribute: str, operator: str, value):
+    """
+    Adds a condition element to a filter, translating OData string functions to 'like'.
+    """
+    if operator in FETCH_FUNCTIONS:
+        operator, value = 'like', FETCH_FUNCTIONS[operator].format(value)
+    if value is None:
+        operator = {'eq': 'null', 'ne': 'not-null'}[operator]
+        ET.SubElement(parent, 'condition', attribute=attribute, operator=operator)
+        return
+    if isinstance(value, bool):
+        value = int(value)
+    ET.SubElement(parent, 'condition', attribute=attribute, operator=operator, value=str(value))
+
+def build_aggregate_fetch(entity_name: str, groups: list, aggregations: list, conditions: list) -> str:
+    """
+    Builds an aggregate FetchXML query.
+    groups are (attribute, alias) pairs, aggregations are (attribute, method, alias) triples using the
+    FETCH_AGGREGATES names and conditions are (attribute, operator, value) triples combined with 'and'.
+    """
+    fetch = ET.Element('fetch', aggregate='true')
+    entity = ET.SubElement(fetch, 'entity', name=entity_name)
+    for attribute, alias in groups:
+        ET.SubElement(entity, 'attribute', name=attribute, alias=alias, groupby='true')
+    for attribute, method, alias in aggregations:
+        ET.SubElement(entity, 'attribute', name=attribute, alias=alias, aggregate=FETCH_AGGREGATES[method])
+    build_filter(entity, conditions)
+    return ET.tostring(fetch, encoding='unicode')
+
+def build_fetch(entity_name: str, conditions: list, attributes: list = ()) -> str:
+    """
+    Builds a FetchXML query reading the given attributes, or every attribute when none are given,
+    of the rows matching (attribute, operator, value) conditions combined with 'and'.
+    """
+    fetch = ET.Element('fetch')
+    entity = ET.SubElement(fetch, 'entity', name=entity_name)
+    for attribute in attributes:
+        ET.SubElement(entity, 'attribute', name=attribute)
+    build_filter(entity, conditions)
+    return ET.tostring(fetch, encoding='unicode')
+
+def build_filter(entity: ET.Element, conditions: list):
+    if conditions:
+        filter_element = ET.SubElement(entity, 'filter', type='and')
+        for attribute, operator, value in conditions:
+            build_condition(filter_element, attribute, operator, value)
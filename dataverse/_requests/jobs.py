@@ -0,0 +1,75 @@
+import time
+from datetime import datetime, timezone
+from .. import encoding
+
+# statecode of an asyncoperation that has finished, and the statuscode names it can finish or run with
+COMPLETED_STATE = 3
+JOB_STATUSES = {
+    0: 'Waiting For Resources',
+    10: 'Waiting',
+    20: 'In Progress',
+    21: 'Pausing',
+    22: 'Canceling',
+    30: 'Succeeded',
+    31: 'Failed',
+    32: 'Canceled'
+}
+
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+def to_query_expression(session, fetch_xml: str) -> dict:
+    """
+    Converts FetchXML to the QueryExpression actions such as BulkDelete take, using the FetchXmlToQueryExpression function.
+    """
+    literal = "'" + fetch_xml.replace("'", "''") + "'"
+    response = session.query('FetchXmlToQueryExpression(FetchXml=@FetchXml)', {'@FetchXml': literal})
+    query = encoding.loads(response.content)['Query']
+    query['@odata.type'] = 'Microsoft.Dynamics.CRM.QueryExpression'
+    return query
+
+def submit_bulk_delete(session, query: dict, job_name: str) -> str:
+    """
+    Submits a BulkDelete system job deleting every record matching a QueryExpression and returns its asyncoperation id.
+    """
+    return session.action('BulkDelete', {
+        "QuerySet": [query],
+        "JobName": job_name,
+        "SendEmailNotification": False,
+        "ToRecipients": [],
+        "CCRecipients": [],
+        "RecurrencePattern": "",
+        "StartDateTime": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "RunNow": True
+    })['JobId']
+
+def get_bulk_delete_counts(session, job_id: str) -> tuple:
+    """
+    Returns the number of records deleted and failed so far by a BulkDelete job.
+    """
+    rows = encoding.loads(session.query('bulkdeleteoperations', {
+        '$select': 'successcount,failurecount',
+        '$filter': f'_asyncoperationid_value eq {job_id}'
+    }, NO_CACHE).content)['value']
+    if not rows:
+        return 0, 0
+    return rows[0]['successcount'] or 0, rows[0]['failurecount'] or 0
+
+def wait_for_job(session, job_id: str, poll_interval: float = 2, max_interval: float = 60, timeout: float = None, progress=None) -> dict:
+    """
+    Polls an asyncoperation until it completes and returns it. The interval between polls doubles up to max_interval.
+    progress is called with the asyncoperation after every poll. Raises TimeoutError if the job is still running after timeout seconds.
+    """
+    timeStart = time.perf_counter()
+    while True:
+        # the read cache would otherwise answer repeated polls without asking the server
+        job = encoding.loads(session.query(f'asyncoperations({job_id})', {'$select': 'statecode,statuscode,message,friendlymessage'},
+                                           NO_CACHE).content)
+        if progress is not None:
+            progress(job)
+        if job['statecode'] == COMPLETED_STATE:
+            return job
+
+        if timeout is not None and time.perf_counter() - timeStart + poll_interval > timeout:
+            raise TimeoutError(f"Job {job_id} is still {JOB_STATUSES.get(job['statuscode'], job['statuscode'])} after {timeout} seconds.")
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, max_interval)
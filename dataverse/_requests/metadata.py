@@ -1,21 +1,60 @@
+import hashlib
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict
 from ..sessions import DataverseSession
+from ..locking import FileLock, write_json_atomic
 
 CACHE_DIR = '_cache'
+# bumped whenever the cached ColumnDef fields change, so files written by older versions are downloaded again
+METADATA_VERSION = 3
+
+# File and Image columns are reported as Virtual attributes, told apart by their AttributeTypeName
+FILE_TYPE_NAMES = {
+    'FileType': 'File',
+    'ImageType': 'Image'
+}
+
+# metadata types to cast Attributes to when fetching the options of choice columns
+OPTION_SET_TYPES = {
+    'Picklist': 'PicklistAttributeMetadata',
+    'State': 'StateAttributeMetadata',
+    'Status': 'StatusAttributeMetadata'
+}
 
 class ColumnDef:
     """
     Represents the definition of a column in the entity metadata.
     """
-    def __init__(self, display_name: str, logical_name: str, schema_name: str, attribute_type: str, related=None):
+    def __init__(self, display_name: str, logical_name: str, schema_name: str, attribute_type: str, related=None, options=None, option_set=None,
+                 max_length=None, required_level=None, min_value=None, max_value=None, valid_for_create=True, valid_for_update=True):
         self.display_name = display_name
         self.logical_name = logical_name
         self.schema_name = schema_name
         self.attribute_type = attribute_type
         self.related = related
+        self.options = options
+        self.option_set = option_set
+        self.max_length = max_length
+        self.required_level = required_level
+        self.min_value = min_value
+        self.max_value = max_value
+        self.valid_for_create = valid_for_create
+        self.valid_for_update = valid_for_update
+
+    def get_option_value(self, value):
+        """
+        Returns the option value for a choice label. Integer values are returned as they are.
+        If the label is not an option of this column, raises a KeyError.
+        """
+        if self.options is None or isinstance(value, int):
+            return value
+        option_value = self.options.get(value)
+        if option_value is None:
+            raise KeyError(f"Option '{value}' not found in column '{self.display_name}'.")
+        return option_value
 
     def __repr__(self):
         return f"ColumnDef(logical_name={self.logical_name}, attribute_type={self.attribute_type}, related={self.related})"
@@ -56,8 +95,8 @@ class EntityDict:
     """
     Represents a collection of entity definitions, allowing for easy access and management.
     """
-    def __init__(self, entities: Dict[str, EntityDef] = {}):
-        self.entities = entities
+    def __init__(self, entities: Dict[str, EntityDef] = None):
+        self.entities = entities if entities is not None else {}
 
     def add_entity(self, display_name, logical_name, key_column, entity_set_name, columns):
         entity_def = EntityDef(display_name, logical_name, key_column, entity_set_name, columns)
@@ -98,7 +137,15 @@ class EntityDict:
                         'logical_name': col_def.logical_name,
                         'schema_name': col_def.schema_name,
                         'attribute_type': col_def.attribute_type,
-                        'related': col_def.related
+                        'related': col_def.related,
+                        'options': col_def.options,
+                        'option_set': col_def.option_set,
+                        'max_length': col_def.max_length,
+                        'required_level': col_def.required_level,
+                        'min_value': col_def.min_value,
+                        'max_value': col_def.max_value,
+                        'valid_for_create': col_def.valid_for_create,
+                        'valid_for_update': col_def.valid_for_update
                     } for col_name, col_def in entity._columns.items()}
             } for display_name, entity in self.entities.items()
         }
@@ -112,6 +159,43 @@ def get_display_name(entity_json):
     except (KeyError, TypeError):
         return ''
 
+def get_label(label_json):
+    """
+    Extracts and returns the user localized text of a label.
+    """
+    try:
+        return label_json['UserLocalizedLabel']['Label']
+    except (KeyError, TypeError):
+        return ''
+
+def parse_options(option_set):
+    """
+    Parses and returns a label to value map from the given option set metadata.
+    """
+    return {get_label(option['Label']): option['Value'] for option in option_set['Options']}
+
+def get_option_sets(session: DataverseSession, entity_dict: EntityDict):
+    """
+    Fetches the options of every choice column and stores them on the ColumnDefs,
+    so choice labels can be resolved without further requests.
+    """
+    for entity in entity_dict.entities.values():
+        columns = {col.logical_name: col for col in entity._columns.values() if col.attribute_type in OPTION_SET_TYPES}
+        attribute_types = {col.attribute_type for col in columns.values()}
+
+        for attribute_type in attribute_types:
+            response = session.query(
+                f"EntityDefinitions(LogicalName='{entity.logical_name}')/Attributes/Microsoft.Dynamics.CRM.{OPTION_SET_TYPES[attribute_type]}",
+                {"$select": "LogicalName", "$expand": "OptionSet($select=Name,IsGlobal,Options)"})
+
+            for attribute in response.json()['value']:
+                column = columns.get(attribute['LogicalName'])
+                option_set = attribute.get('OptionSet')
+                if column is None or option_set is None:
+                    continue
+                column.options = parse_options(option_set)
+                column.option_set = option_set['Name'] if option_set.get('IsGlobal') else None
+
 def is_recently_modified(file_path, hours=1):
     """
     Checks if the given file was modified within the specified number of hours.
@@ -130,56 +214,183 @@ def parse_attributes(attributes):
 
         display_name = get_display_name(attribute)
         related = attribute['Targets'][0] if 'Targets' in attribute else None
+        type_name = (attribute.get('AttributeTypeName') or {}).get('Value')
         columns[display_name] = ColumnDef(
             display_name=display_name,
             logical_name=attribute['LogicalName'],
             schema_name=attribute['SchemaName'],
-            attribute_type=attribute['AttributeType'],
-            related=related
+            attribute_type=FILE_TYPE_NAMES.get(type_name, attribute['AttributeType']),
+            related=related,
+            max_length=attribute.get('MaxLength'),
+            required_level=(attribute.get('RequiredLevel') or {}).get('Value'),
+            min_value=attribute.get('MinValue'),
+            max_value=attribute.get('MaxValue'),
+            valid_for_create=attribute.get('IsValidForCreate', True),
+            valid_for_update=attribute.get('IsValidForUpdate', True)
         )
 
     return columns
 
-def get_entity_definitions(session: DataverseSession):
+def download_entity_definitions(session: DataverseSession):
+    """
+    Downloads the entity definitions and the options of their choice columns.
+    Returns the EntityDict and the raw entity metadata kept for debugging.
+    """
+    entity_dict = EntityDict()
+    entities_debug = []
+    response = session.query("EntityDefinitions", {
+        "$select": "LogicalName,DisplayName,PrimaryNameAttribute,EntitySetName",
+        "$expand": "Attributes"
+    })
+    all_entities = response.json()
+
+    for entity in all_entities['value']:
+        # Assuming entities with 'able_' prefix are relevant
+        if not str(entity['LogicalName']).startswith('able_'): 
+            continue
+
+        entity_name = get_display_name(entity)
+        if entity_name == '':
+            continue
+
+        entities_debug.append(entity)
+        columns = parse_attributes(entity['Attributes'])
+        logical_name = entity['LogicalName']
+        key_column = entity['PrimaryNameAttribute']
+        entity_dict.add_entity(entity_name, logical_name, key_column, entity['EntitySetName'], columns)
+
+    get_option_sets(session, entity_dict)
+    return entity_dict, entities_debug
+
+def get_environment_key(environmentURI: str) -> str:
+    return environmentURI.removesuffix('/').lower()
+
+class MetadataCache:
     """
-    Retrieves entity definitions from the Dataverse session.
+    Shares one EntityDict per environment between every session and API in the process.
+    The cache file is refreshed by one process at a time under a file lock and replaced atomically.
+    Once loaded, stale metadata keeps being served while a background thread refreshes it.
     """
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+    _instances = {}
+    _instances_lock = threading.Lock()
 
-    entities_file = os.path.join(CACHE_DIR, 'entities.json')
-    entities_debug_file = os.path.join(CACHE_DIR, 'entities_debug.json')
+    def __init__(self, environmentURI: str, cache_dir: str = CACHE_DIR, max_age_hours: float = 1):
+        self.environmentURI = environmentURI
+        self.max_age_hours = max_age_hours
+        # every environment keeps its own files, named by a hash of its host, and the version is part of the
+        # file name so checking it never reads the file
+        suffix = hashlib.sha256(get_environment_key(environmentURI).encode('utf-8')).hexdigest()[:12]
+        self.entities_file = os.path.join(cache_dir, f'entities_v{METADATA_VERSION}_{suffix}.json')
+        self.entities_debug_file = os.path.join(cache_dir, f'entities_debug_{suffix}.json')
+        self.lock_file = os.path.join(cache_dir, f'entities_{suffix}.lock')
+        self.entity_dict = None
+        self._loaded_mtime = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
 
-    if not os.path.exists(entities_file) or not is_recently_modified(entities_file):
-        entity_dict = EntityDict()
-        entities_debug = []
-        response = session.query("EntityDefinitions", {"$expand": "Attributes,OneToManyRelationships"})
-        all_entities = response.json()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
 
-        for entity in all_entities['value']:
-            # Assuming entities with 'able_' prefix are relevant
-            if not str(entity['LogicalName']).startswith('able_'): 
-                continue
+    @classmethod
+    def for_environment(cls, environmentURI: str) -> 'MetadataCache':
+        """
+        Returns the process-wide cache for an environment, creating it on first use.
+        """
+        key = get_environment_key(environmentURI)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(environmentURI)
+            return cls._instances[key]
 
-            entity_name = get_display_name(entity)
-            if entity_name == '':
-                continue
+    def get(self, session: DataverseSession) -> EntityDict:
+        """
+        Returns the shared EntityDict, loading or downloading it on first use and
+        refreshing it in the background once it is older than max_age_hours.
+        """
+        with self._lock:
+            if self.entity_dict is None:
+                if self.is_current():
+                    self.entity_dict = self._read()
+                else:
+                    self.refresh(session)
+                    if self.entity_dict is None:
+                        raise ValueError(f"No entity metadata could be loaded for {self.environmentURI}.")
+                    return self.entity_dict
+            elif self.is_current() and os.path.getmtime(self.entities_file) > self._loaded_mtime:
+                # another process has refreshed the cache file since it was loaded
+                self._update(self._read())
 
-            entities_debug.append(entity)
-            columns = parse_attributes(entity['Attributes'])
-            logical_name = entity['LogicalName']
-            key_column = entity['PrimaryNameAttribute']
-            entity_dict.add_entity(entity_name, logical_name, key_column, entity['EntitySetName'], columns)
+            if not self.is_fresh() and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_in_background, args=(session,), daemon=True).start()
+            return self.entity_dict
 
-        if len(entities_debug) > 0:
-            with open(entities_debug_file, "w") as outfile:
-                json.dump(entities_debug, outfile)
+    def is_current(self) -> bool:
+        """
+        Returns whether a cache file written with the current METADATA_VERSION exists.
+        """
+        return os.path.exists(self.entities_file)
 
-        if entity_dict.entities:
-            with open(entities_file, "w") as outfile:
-                json.dump(entity_dict.to_json(), outfile)
+    def is_fresh(self) -> bool:
+        return self.is_current() and is_recently_modified(self.entities_file, self.max_age_hours)
 
-    # Read from cache
-    with open(entities_file, "r") as this_file:
-        json_contents = json.load(this_file)
-        return EntityDict.from_json(json_contents)
\ No newline at end of file
+    def refresh(self, session: DataverseSession, blocking: bool = True):
+        """
+        Downloads the metadata unless another process refreshed the cache file while this one waited for the lock.
+        Without blocking, returns straight away when another process is already refreshing.
+        """
+        lock = FileLock(self.lock_file)
+        if not lock.acquire(blocking):
+            print("Entity metadata is being refreshed by another process. Using cached metadata.")
+            return
+        try:
+            if not self.is_fresh():
+                print("Refreshing entity metadata.")
+                entity_dict, entities_debug = download_entity_definitions(session)
+                if len(entities_debug) > 0:
+                    write_json_atomic(self.entities_debug_file, entities_debug)
+                if entity_dict.entities:
+                    self._write(entity_dict)
+            if self.is_current():
+                self._update(self._read())
+        finally:
+            lock.release()
+
+    def save(self, entity_dict: EntityDict):
+        """
+        Writes metadata changed in memory, such as newly added choice options, to the cache file,
+        so other processes and later runs do not read the old metadata until the next refresh.
+        """
+        with FileLock(self.lock_file):
+            self._write(entity_dict)
+            # this process already holds the written metadata, so it is not read back
+            self._loaded_mtime = os.path.getmtime(self.entities_file)
+
+    def _write(self, entity_dict: EntityDict):
+        write_json_atomic(self.entities_file, {'version': METADATA_VERSION, 'entities': entity_dict.to_json()})
+
+    def _refresh_in_background(self, session: DataverseSession):
+        try:
+            self.refresh(session, blocking=False)
+        except Exception as error:
+            print(f"Refreshing entity metadata failed, using cached metadata: {error}")
+        finally:
+            self._refreshing = False
+
+    def _read(self) -> EntityDict:
+        self._loaded_mtime = os.path.getmtime(self.entities_file)
+        with open(self.entities_file, "r") as this_file:
+            return EntityDict.from_json(json.load(this_file)['entities'])
+
+    def _update(self, entity_dict: EntityDict):
+        # swap the contents in place so every API holding the EntityDict sees the new metadata
+        if self.entity_dict is None:
+            self.entity_dict = entity_dict
+        else:
+            self.entity_dict.entities = entity_dict.entities
+
+def get_entity_definitions(session: DataverseSession):
+    """
+    Retrieves entity definitions from the Dataverse session, shared by every caller in the process.
+    """
+    return MetadataCache.for_environment(session.environmentURI).get(session)
@@ -1,51 +1,348 @@
-import json
-from typing import Dict
-import pandas as pd
-import urllib
-from dataverse._requests.metadata import EntityDef, get_entity_definitions
+import urllib.parse
+from dataverse._requests.metadata import EntityDef, MetadataCache, OPTION_SET_TYPES, get_entity_definitions
+from dataverse._requests import files, jobs
+from . import columnar
 from .sessions import DataverseSession
+from .query import Query, format_value
+from .results import MutateResult
+from ._requests.fetchxml import build_fetch, get_entity_name, get_top, has_conditions
+
+FILE_TYPES = {'File', 'Image'}
 
 class DataverseAPI:
     def __init__(self, session: DataverseSession):
         self.session = session
         self.entities = get_entity_definitions(session)
+        self.last_validation = None
+
+    def create(self, display_name: str, data, parse_response: bool = True, minimal: bool = False, sink=None, validate: bool = False,
+               batch_size: int = columnar.BATCH_SIZE):
+        """
+        Creates a record per row of a CSV or Parquet path, a list of dicts, a pandas DataFrame, a pyarrow Table or RecordBatch,
+        or an iterable of RecordBatches. Rows are sent batch_size at a time, with each batch's payloads built column by column.
+        pandas is only imported to read CSVs or to validate.
+        """
+        return self._mutate(display_name, data, 'POST', None, None, parse_response, minimal, sink, validate, batch_size)
+
+    def update(self, display_name: str, data, key: str = None, parse_response: bool = True, minimal: bool = False, sink=None,
+               validate: bool = False, batch_size: int = columnar.BATCH_SIZE):
+        """
+        Updates existing records from the same inputs as create. Each row is addressed by its key column, the entity's
+        primary id or an alternate key, which defaults to the key column used for lookups. Rows whose record
+        does not exist fail with 404.
+        """
+        return self._mutate(display_name, data, 'PATCH', key, '*', parse_response, minimal, sink, validate, batch_size)
+
+    def upsert(self, display_name: str, data, key: str = None, parse_response: bool = True, minimal: bool = False, sink=None,
+               validate: bool = False, batch_size: int = columnar.BATCH_SIZE):
+        """
+        Updates the record addressed by each row's key column like update, creating it when it does not exist.
+        """
+        return self._mutate(display_name, data, 'PATCH', key, None, parse_response, minimal, sink, validate, batch_size)
+
+    def upload_file(self, display_name: str, record_id: str, column_name: str, path: str, parallelism: int = 4):
+        """
+        Uploads a file from disk to a File or Image column in parallel blocks.
+        """
+        entity = self.entities.get_entity(display_name)
+        column = self._get_file_column(entity, column_name)
+        return files.upload_file(self.session, entity.logical_name, record_id, column.logical_name, path, parallelism)
 
-    def create(self, display_name: str, csv: str):
+    def download_file(self, display_name: str, record_id: str, column_name: str, path: str, parallelism: int = 4):
+        """
+        Downloads a File or Image column to a path, or into a directory under its own file name, in parallel ranges.
+        """
         entity = self.entities.get_entity(display_name)
-        df = self._get_dataframe(csv)
-        payloads = self._build_payloads(entity, df)
-        return self.session.mutate(entity.entity_set_name, payloads)
-    
-    def relate(self, from_entity: str, to_entity: str, csv: str):
+        column = self._get_file_column(entity, column_name)
+        return files.download_file(self.session, entity.logical_name, record_id, column.logical_name, path, parallelism)
+
+    def validate(self, display_name: str, data, check_lookups: bool = False, operation: str = 'create', key: str = None):
+        """
+        Validates a CSV or any other input create accepts against the entity metadata without sending any rows.
+        Set check_lookups to True to also confirm every lookup key exists, using one query per 100 keys.
+        Set operation to 'update' to check rows meant for update or upsert, addressed by the key column.
+        """
+        from . import validation
         entity = self.entities.get_entity(display_name)
-        df = self._get_dataframe(csv)
-        payloads = self._build_payloads(entity, df)
-        return self.session.mutate(entity.entity_set_name, payloads)
-    
-    def _get_dataframe(self, csv: str):
-        # read the CSV and convert to dataframe
-        df = pd.read_csv(csv)
-        return json.loads(df.to_json(orient = "records"))
-    
-    def _build_payloads(self, entity: EntityDef, df):
-        payloads = []
-        for record in df:
-            payloads.append(self._build_payload(entity, record))
-        return payloads
+        key_column = entity.get_column(key or entity.key_column) if operation == 'update' else None
+        df = self._get_dataframe(entity, data)
+        return validation.validate(df, entity, self.entities, self.session if check_lookups else None,
+                                   operation=operation, key_column=key_column)
+
+    def query(self, display_name: str) -> Query:
+        """
+        Starts a query against an entity, e.g. api.query('Survey Finding').select('Survey', 'Penalty Amount').where('Penalty Amount', 'gt', 0).fetch()
+        """
+        return Query(self.session, self.entities, self.entities.get_entity(display_name))
+
+    def fetch_xml(self, fetch_xml: str, page_size: int = 5000, sink=None):
+        """
+        Runs a FetchXML query, following paging cookies until every page is read.
+        Use it for joins and conditions OData cannot express.
+        """
+        entity = self.entities.get_entity(get_entity_name(fetch_xml))
+        return self.session.fetch(entity.entity_set_name, fetch_xml, page_size, sink)
+
+    def bulk_delete(self, display_name: str, filter=None, server: bool = True, all_records: bool = False, job_name: str = None,
+                    batch_size: int = 1000, timeout: float = None, sink=None):
+        """
+        Deletes every record matching filter, a Query from api.query() with where() conditions or a FetchXML string.
+        A filter without conditions is refused unless all_records is True, which also allows leaving filter out.
+        By default one BulkDelete system job is submitted and polled until it finishes, so the rows cost no requests
+        or throttle budget, and a dict with the job_id, status, deleted and failed counts is returned.
+        Set server to False to read the matching ids and delete them through $batch instead, which returns
+        one result per row like batch().
+        """
+        entity = self.entities.get_entity(display_name)
+        id_column = f'{entity.logical_name}id'
+        if filter is None:
+            fetch_xml = build_fetch(entity.logical_name, [], [id_column])
+        elif isinstance(filter, Query):
+            fetch_xml = filter.to_fetch_xml(id_column)
+            if filter._top is not None:
+                raise ValueError('A bulk delete removes every matching record and cannot be limited with top().')
+        else:
+            fetch_xml = filter
+            if get_entity_name(fetch_xml) != entity.logical_name:
+                raise ValueError(f"The FetchXML does not read from '{entity.display_name}'.")
+            if get_top(fetch_xml) is not None:
+                raise ValueError('A bulk delete removes every matching record and cannot be limited with top.')
+
+        if not has_conditions(fetch_xml) and not all_records:
+            raise ValueError(f"The filter has no conditions and would delete every '{entity.display_name}' record. "
+                             "Pass all_records=True to do so.")
+
+        if not server:
+            ids = [row[id_column] for row in self.session.fetch(entity.entity_set_name, fetch_xml)]
+            print(f'DELETING {len(ids)} {entity.display_name.upper()} RECORDS THROUGH $BATCH.')
+            return self.session.batch([('DELETE', f'{entity.entity_set_name}({record_id})', None) for record_id in ids], batch_size, sink)
+
+        query = jobs.to_query_expression(self.session, fetch_xml)
+        job_id = jobs.submit_bulk_delete(self.session, query, job_name or f'Bulk delete {entity.display_name}')
+        print(f'BULK DELETE JOB {job_id} SUBMITTED.')
+
+        def progress(job):
+            deleted, failed = jobs.get_bulk_delete_counts(self.session, job_id)
+            print(f"BULK DELETE {jobs.JOB_STATUSES.get(job['statuscode'], job['statuscode']).upper()}: {deleted} DELETED, {failed} FAILED.")
+
+        job = jobs.wait_for_job(self.session, job_id, timeout=timeout, progress=progress)
+        deleted, failed = jobs.get_bulk_delete_counts(self.session, job_id)
+        return {
+            'job_id': job_id,
+            'status': jobs.JOB_STATUSES.get(job['statuscode'], job['statuscode']),
+            'deleted': deleted,
+            'failed': failed,
+            'message': job.get('friendlymessage') or job.get('message')
+        }
+
+    def upsert_options(self, display_name: str, column_name: str, options, solution: str = None, language_code: int = 1033, batch_size: int = 1000):
+        """
+        Adds or updates many options of a choice column through $batch.
+        Options are given as a CSV path or a list of dicts with a Label and optionally a Value and Color.
+        Options whose label or value already exists are updated, all others are inserted.
+        """
+        entity = self.entities.get_entity(display_name)
+        column = entity.get_column(column_name)
+        if column.attribute_type != 'Picklist':
+            raise ValueError(f"Column '{column.display_name}' is not a choice column.")
+
+        if isinstance(options, str):
+            import pandas as pd
+            from . import readers
+            options = readers.to_records(pd.read_csv(options, dtype={'Label': 'string', 'Value': 'Int64', 'Color': 'string'}))
 
-    def _build_payload(self, entity: EntityDef, values: Dict[str, str | int]):
-        payload = {}
-        for column_name, value in values.items():
-            if value == None: continue
+        existing = column.options or {}
+        existing_values = set(existing.values())
+        operations = []
+        for option in options:
+            label = option['Label']
+            value = option.get('Value')
+            if value is None and label in existing:
+                value = existing[label]
+            action = 'UpdateOptionValue' if value in existing_values else 'InsertOptionValue'
 
-            # Find the logical name using the Names map
-            column = entity.get_column(column_name)
+            payload = {'Label': self._build_label(label, language_code)}
+            if column.option_set:
+                payload['OptionSetName'] = column.option_set
+            else:
+                payload['EntityLogicalName'] = entity.logical_name
+                payload['AttributeLogicalName'] = column.logical_name
+            if value is not None:
+                payload['Value'] = value
+            if option.get('Color'):
+                payload['Color'] = option['Color']
+            if solution:
+                payload['SolutionUniqueName'] = solution
+            if action == 'UpdateOptionValue':
+                payload['MergeLabels'] = True
+            operations.append(('POST', action, payload))
+
+        results = self.session.batch(operations, batch_size)
+
+        # keep the cached label map, in memory and in the metadata cache file, in step with the options that were saved
+        column.options = existing
+        saved = False
+        for option, (_, action, payload), result in zip(options, operations, results):
+            if result['error'] is None:
+                existing[option['Label']] = (result['content'] or {}).get('NewOptionValue', payload.get('Value'))
+                saved = True
+        if saved:
+            MetadataCache.for_environment(self.session.environmentURI).save(self.entities)
+        return results
+
+    def _build_label(self, label: str, language_code: int):
+        localized_label = {
+            "@odata.type": "Microsoft.Dynamics.CRM.LocalizedLabel",
+            "Label": label,
+            "LanguageCode": language_code,
+            "IsManaged": False
+        }
+        return {
+            "@odata.type": "Microsoft.Dynamics.CRM.Label",
+            "LocalizedLabels": [localized_label],
+            "UserLocalizedLabel": localized_label
+        }
+
+    def _get_file_column(self, entity: EntityDef, column_name: str):
+        column = entity.get_column(column_name)
+        if column.attribute_type not in FILE_TYPES:
+            raise ValueError(f"Column '{column.display_name}' is not a File or Image column.")
+        return column
+
+    def _get_created_ids(self, entity: EntityDef, result):
+        if isinstance(result, MutateResult):
+            return result.ids
+        id_column = f'{entity.logical_name}id'
+        return [(payload['_REQUEST']['HTTP_CONTENT'] or {}).get(id_column) for payload in result]
+
+    def _upload_files(self, entity: EntityDef, file_columns: list, columns: dict, result):
+        """
+        Uploads the files of every row whose record was saved. A failed upload does not stop the others
+        and is recorded as the error of its row in result.
+        """
+        for row, record_id in enumerate(self._get_created_ids(entity, result)):
+            if record_id is None:
+                continue
+            errors = []
+            for header in file_columns:
+                if columns[header][row] is None:
+                    continue
+                try:
+                    self.upload_file(entity.display_name, record_id, header, columns[header][row])
+                # requests raises its errors as OSErrors, like a missing or unreadable file
+                except (OSError, ValueError) as error:
+                    errors.append(f"Uploading '{header}' failed: {error}")
+            if not errors:
+                continue
+            if isinstance(result, MutateResult):
+                result.errors[row] = ' '.join(errors)
+            else:
+                result[row]['_REQUEST']['UPLOAD_ERROR'] = ' '.join(errors)
+
+    def _mutate(self, display_name: str, data, method: str, key: str, if_match: str, parse_response: bool, minimal: bool, sink,
+                validate: bool, batch_size: int):
+        entity = self.entities.get_entity(display_name)
+        key_column = entity.get_column(key or entity.key_column) if method == 'PATCH' else None
+        index = None
+        if validate or (isinstance(data, str) and not columnar.is_parquet(data)):
+            data = self._get_dataframe(entity, data, validate, 'update' if method == 'PATCH' else 'create', key_column)
+            # rows are reported by their position in the input, matching the rows of the validation report
+            index = data.index.tolist()
+
+        # file uploads need the id of every row, so results are kept compact when they go to a sink
+        compact = minimal or sink is not None
+        processed = MutateResult(self.session.build_uri(entity.entity_set_name)) if compact else []
+        offset = 0
+        for columns, length in columnar.iter_batches(data, batch_size):
+            headers = {header: entity.get_column(header) for header in columns}
+            keys = None
+            if key_column is not None:
+                key_header = next((header for header, column in headers.items() if column is key_column), None)
+                if key_header is None:
+                    raise ValueError(f"Column '{key_column.display_name}' is needed to address the records in '{entity.display_name}'.")
+                keys = [self._format_key(entity, key_column, value) for value in columns.pop(key_header)]
+
+            payloads = self._build_payloads(entity, columns, length)
+            file_columns = [header for header in columns if headers[header].attribute_type in FILE_TYPES]
+            # without return=minimal, the record ids needed for file uploads are only read from parsed responses
+            result = self.session.mutate(entity.entity_set_name, payloads, parse_response or bool(file_columns), compact, None,
+                                         method, keys, if_match)
+            try:
+                if file_columns:
+                    self._upload_files(entity, file_columns, columns, result)
+            finally:
+                # the saved records are reported even if the uploads are interrupted
+                if sink is not None:
+                    result.write_to(sink, offset, index)
+                else:
+                    processed.extend(result)
+            offset += length
+
+        if sink is not None:
+            sink.flush()
+            return sink
+        return processed
+
+    def _format_key(self, entity: EntityDef, column, value) -> str:
+        # records are addressed by their primary id as it is, or by an alternate key as column='value'
+        if column.logical_name == f'{entity.logical_name}id':
+            return str(value)
+        # values go into the URL path, where characters such as # ? / % & would otherwise end or change it
+        return urllib.parse.quote(f'{column.logical_name}={format_value(value)}', safe="'=,")
+
+    def _get_dataframe(self, entity: EntityDef, data, validate: bool = False, operation: str = 'create', key_column=None):
+        """
+        Reads the input into a DataFrame, typing CSVs from the entity metadata. With validate set,
+        only the rows that pass validation are kept and the report is stored on last_validation.
+        """
+        import pandas as pd
+        from . import readers, validation
+        if columnar.is_dataframe(data):
+            df = data
+        elif columnar.is_parquet(data):
+            df = pd.read_parquet(data)
+        elif isinstance(data, str):
+            df = readers.read_csv(data, entity)
+        elif isinstance(data, list):
+            df = pd.DataFrame(data)
+        elif hasattr(data, 'to_pandas'):
+            df = data.to_pandas()
+        else:
+            raise ValueError("Only CSV and Parquet paths, lists of dicts, DataFrames, Tables and RecordBatches can be validated.")
+
+        if validate:
+            self.last_validation = validation.validate(df, entity, self.entities, operation=operation, key_column=key_column)
+            print(f'{self.last_validation.rejected_rows} ROWS REJECTED BY VALIDATION.')
+            df = self.last_validation.valid
+        return df
+
+    def _build_payloads(self, entity: EntityDef, columns: dict, length: int) -> list:
+        """
+        Builds the payloads of a batch one column at a time, so each column is resolved against the metadata
+        once and each distinct choice label is looked up once.
+        """
+        payloads = [{} for _ in range(length)]
+        for header, values in columns.items():
+            column = entity.get_column(header)
+
+            # file paths are uploaded once the record exists
+            if column.attribute_type in FILE_TYPES: continue
 
             if column.attribute_type == "Lookup":
                 related_entity = self.entities.get_entity(column.related)
                 related_entity_key_column = related_entity.key_column
                 # Adjust lookup binding as per the odata.bind format
-                payload[f"{column.schema_name}@odata.bind"] = f'/{related_entity.entity_set_name}({related_entity_key_column}=\'{(value)}\')'
+                name = f"{column.schema_name}@odata.bind"
+                values = [None if value is None else f'/{related_entity.entity_set_name}({related_entity_key_column}=\'{value}\')' for value in values]
+            elif column.attribute_type in OPTION_SET_TYPES:
+                # choice labels resolve through the cached option map
+                name = column.logical_name
+                option_values = {value: column.get_option_value(value) for value in set(values) if value is not None}
+                values = [option_values.get(value) for value in values]
             else:
-                payload[column.logical_name] = value
-        return payload
\ No newline at end of file
+                name = column.logical_name
+
+            for payload, value in zip(payloads, values):
+                if value is not None:
+                    payload[name] = value
+        return payloads
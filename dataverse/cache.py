@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from . import encoding
+from .locking import write_json_atomic
+
+# collection responses carry no ETag, so they are only served from the cache for this many seconds
+DEFAULT_MAX_AGE = 300
+
+class CacheEntry:
+    """
+    A cached GET response and the validator used to revalidate it.
+    """
+    def __init__(self, uri: str, etag: str, content: bytes, content_type: str, stored_at: float):
+        self.uri = uri
+        self.etag = etag
+        self.content = content
+        self.content_type = content_type
+        self.stored_at = stored_at
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.uri
+        response._content = self.content
+        response.headers['Content-Type'] = self.content_type
+        if self.etag:
+            response.headers['ETag'] = self.etag
+        return response
+
+    def to_json(self):
+        return {
+            'uri': self.uri,
+            'etag': self.etag,
+            'content': self.content.decode('utf-8'),
+            'content_type': self.content_type,
+            'stored_at': self.stored_at
+        }
+
+    @classmethod
+    def from_json(cls, json_data):
+        return cls(json_data['uri'], json_data['etag'], json_data['content'].encode('utf-8'), json_data['content_type'], json_data['stored_at'])
+
+def normalise_uri(uri: str, headers: dict = None) -> str:
+    """
+    Builds the cache key for a GET: the URI with a lower case host and sorted query options,
+    plus the Prefer header since it changes what the server returns.
+    """
+    parts = urllib.parse.urlsplit(uri)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)), quote_via=urllib.parse.quote)
+    key = urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+    prefer = (headers or {}).get('Prefer')
+    return f'{key}|{prefer}' if prefer else key
+
+class ReadCache:
+    """
+    Read-through cache for DataverseSession GETs.
+    Responses are kept in an in-memory LRU and optionally on disk, keyed by normalised URI, with at most
+    max_entries in each. Responses younger than max_age seconds are served without a request.
+    Older entries with an ETag header, or an @odata.etag in a single-record body, are revalidated with
+    If-None-Match and served from the cache on 304 Not Modified.
+    Collection responses, such as reads of whole reference tables, carry no ETag, so they are only cached
+    while younger than max_age. Send Cache-Control: no-cache to always revalidate.
+    Identical GETs issued at the same time share a single request.
+    """
+    def __init__(self, max_entries: int = 256, directory: str = None, max_age: float = DEFAULT_MAX_AGE):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._files = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            # files left by earlier runs count towards max_entries, oldest first
+            paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')]
+            for path in sorted(paths, key=os.path.getmtime):
+                self._files[path] = None
+            self._prune_files()
+
+    def get(self, session, uri: str, headers: dict = None) -> requests.Response:
+        """
+        Returns the response for a GET, from the cache when it is still valid.
+        """
+        key = normalise_uri(uri, headers)
+        with self._lock:
+            entry = self._lookup(key)
+            no_cache = (headers or {}).get('Cache-Control') == 'no-cache'
+            if entry is not None and not no_cache and self.max_age and time.time() - entry.stored_at < self.max_age:
+                self.hits += 1
+                return entry.to_response()
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            response = self._revalidate(session, key, uri, headers, entry)
+            future.set_result(response)
+            return response
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _revalidate(self, session, key: str, uri: str, headers: dict, entry: CacheEntry) -> requests.Response:
+        request_headers = dict(headers or {})
+        # the session sends If-None-Match: null by default, which would stop the server answering 304
+        request_headers['If-None-Match'] = entry.etag if entry is not None and entry.etag else None
+
+        response = session._send_get(uri, request_headers)
+        if response.status_code == 304 and entry is not None:
+            self.hits += 1
+            entry.stored_at = time.time()
+            self._store(key, entry)
+            return entry.to_response()
+
+        self.misses += 1
+        etag = response.headers.get('ETag') or self._body_etag(response)
+        if etag or self.max_age:
+            self._store(key, CacheEntry(uri, etag, response.content, response.headers.get('Content-Type', 'application/json'), time.time()))
+        return response
+
+    def _body_etag(self, response) -> str:
+        # single records return their version as @odata.etag in the body instead of an ETag header
+        if 'json' not in response.headers.get('Content-Type', '') or not response.content:
+            return None
+        try:
+            body = encoding.loads(response.content)
+        except ValueError:
+            return None
+        return body.get('@odata.etag') if isinstance(body, dict) else None
+
+    def _lookup(self, key: str) -> CacheEntry:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        if self.directory is not None:
+            path = self._path(key)
+            if os.path.exists(path):
+                with open(path, "r") as this_file:
+                    entry = CacheEntry.from_json(json.load(this_file))
+                self._remember(key, entry)
+                self._files[path] = None
+                self._files.move_to_end(path)
+        return entry
+
+    def _store(self, key: str, entry: CacheEntry):
+        with self._lock:
+            self._remember(key, entry)
+
+        if self.directory is not None:
+            path = self._path(key)
+            write_json_atomic(path, entry.to_json())
+            with self._lock:
+                self._files[path] = None
+                self._files.move_to_end(path)
+                self._prune_files()
+
+    def _prune_files(self):
+        while len(self._files) > self.max_entries:
+            path, _ = self._files.popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def __repr__(self):
+        return f"ReadCache(entries={len(self._entries)}, hits={self.hits}, misses={self.misses})"
@@ -0,0 +1,93 @@
+import sys
+
+# rows turned into payloads and sent per mutate call
+BATCH_SIZE = 5000
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+def is_parquet(path) -> bool:
+    return isinstance(path, str) and path.lower().endswith(PARQUET_EXTENSIONS)
+
+def is_dataframe(data) -> bool:
+    # a DataFrame can only have been made if pandas is already imported, so this never imports it
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(data, pd.DataFrame)
+
+def is_arrow(data) -> bool:
+    pa = sys.modules.get('pyarrow')
+    return pa is not None and isinstance(data, (pa.Table, pa.RecordBatch, pa.RecordBatchReader))
+
+def iter_batches(data, batch_size: int = BATCH_SIZE):
+    """
+    Yields (columns, length) for every batch_size rows of a list of dicts, a pandas DataFrame, a pyarrow Table,
+    a RecordBatch, an iterable of RecordBatches or a Parquet path. columns maps each column name to its values
+    for the batch as plain Python values, with None for missing values.
+    """
+    if is_dataframe(data):
+        for first in range(0, len(data), batch_size):
+            part = data.iloc[first:first + batch_size]
+            yield pandas_columns(part), len(part)
+        return
+    if isinstance(data, list) and all(isinstance(record, dict) for record in data[:1]):
+        for first in range(0, len(data), batch_size):
+            part = data[first:first + batch_size]
+            headers = dict.fromkeys(header for record in part for header in record)
+            yield {header: [record.get(header) for record in part] for header in headers}, len(part)
+        return
+
+    if is_parquet(data):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Reading Parquet files requires pyarrow. Install it with 'pip install pyarrow'.")
+        batches = pyarrow.parquet.ParquetFile(data).iter_batches(batch_size)
+    elif hasattr(data, 'to_batches'):
+        batches = data.to_batches(max_chunksize=batch_size)
+    elif hasattr(data, 'num_rows') and hasattr(data, 'schema'):
+        batches = [data]
+    else:
+        batches = data
+
+    for batch in batches:
+        # slices share the buffers of the batch
+        for first in range(0, batch.num_rows, batch_size):
+            part = batch.slice(first, batch_size)
+            yield arrow_columns(part), part.num_rows
+
+def arrow_columns(batch) -> dict:
+    return {name: arrow_values(batch.column(index)) for index, name in enumerate(batch.schema.names)}
+
+def arrow_values(array) -> list:
+    """
+    Converts an Arrow array to the Python values Dataverse expects. Conversions run over the whole array,
+    and dictionary encoded columns are converted once per distinct value.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    data_type = array.type
+    if pa.types.is_dictionary(data_type):
+        dictionary = arrow_values(array.dictionary)
+        return [None if index is None else dictionary[index] for index in array.indices.to_pylist()]
+    if pa.types.is_timestamp(data_type):
+        # strftime prints fractional seconds for finer units, so times are truncated to seconds in UTC first
+        array = array.cast(pa.timestamp('s', 'UTC' if data_type.tz else None), safe=False)
+        return pc.strftime(array, format=DATETIME_FORMAT).to_pylist()
+    if pa.types.is_date(data_type):
+        return array.cast(pa.string()).to_pylist()
+    # decimals stay decimal.Decimal, which encoding writes as exact JSON numbers
+    return array.to_pylist()
+
+def pandas_columns(df) -> dict:
+    """
+    Converts each column of a DataFrame to a list of plain Python values, with None for missing values.
+    """
+    import pandas as pd
+
+    columns = {}
+    for header in df.columns:
+        series = df[header]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = (series.dt.tz_localize('UTC') if series.dt.tz is None else series.dt.tz_convert('UTC')).dt.strftime(DATETIME_FORMAT)
+        columns[header] = series.astype(object).where(series.notna(), None).tolist()
+    return columns
@@ -0,0 +1,45 @@
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# stands in for each Decimal while encoding, then is replaced by its digits
+DECIMAL_MARKER = '\x00decimal\x00'
+ENCODED_DECIMAL_MARKER = b'"\\u0000decimal\\u0000"'
+
+def dumps(obj) -> bytes:
+    """
+    Encodes an object straight to UTF-8 JSON bytes.
+    Uses orjson when it is installed, otherwise falls back to the standard library.
+    Decimal values, such as Money read from a CSV, are written as JSON numbers with all of their digits.
+    """
+    decimals = []
+
+    def default(value):
+        if isinstance(value, Decimal):
+            decimals.append(value)
+            return DECIMAL_MARKER
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+    if orjson is not None:
+        data = orjson.dumps(obj, default=default)
+    else:
+        data = json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=default).encode('utf-8')
+    if not decimals:
+        return data
+
+    # neither encoder can write a raw number, so the markers are swapped for the digits in the order they were written
+    parts = data.split(ENCODED_DECIMAL_MARKER)
+    encoded = [part for value, text in zip(decimals, parts) for part in (text, format(value, 'f').encode('ascii'))]
+    return b''.join(encoded + parts[len(decimals):])
+
+def loads(data: bytes | str):
+    """
+    Decodes JSON bytes or text, using orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
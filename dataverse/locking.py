@@ -0,0 +1,74 @@
+import errno
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """
+    An exclusive lock held on a lock file, shared between processes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Takes the lock. With blocking set to False, returns False straight away if another process holds it.
+        """
+        self._file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError as error:
+                        # LK_LOCK gives up after about ten seconds, so a blocking acquire keeps trying
+                        if not blocking or error.errno != errno.EDEADLOCK:
+                            raise
+            return True
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+def write_json_atomic(path: str, data):
+    """
+    Writes JSON to a temporary file in the same directory and renames it over the target,
+    so readers in other processes never see a partially written file.
+    """
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(handle, "w") as outfile:
+            json.dump(data, outfile)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
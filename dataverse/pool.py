@@ -0,0 +1,148 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .results import MutateResult
+from .sessions import DataverseSession, DataverseSessions
+
+class SessionPool:
+    """
+    Spreads work across several authenticated identities. Service protection limits apply per identity,
+    so each session keeps its own throttle state and every chunk of work goes to the identity with the
+    most remaining budget. A pool can be used anywhere a DataverseSession is, including DataverseAPI.
+    """
+    def __init__(self, sessions: list, concurrency: int = 4):
+        if not sessions:
+            raise ValueError("A SessionPool needs at least one session.")
+        self.sessions = sessions
+        self.concurrency = concurrency
+        self.environmentURI = sessions[0].environmentURI
+        self._in_use = {id(session): 0 for session in sessions}
+        self._available = threading.Condition()
+
+    @classmethod
+    def from_config(cls, environmentURI: str, tenantID: str, identities: list, concurrency: int = 4):
+        """
+        Authenticates each identity, given as a dict with a clientID and clientSecret, as an application user.
+        """
+        sessions = [DataverseSessions.getApplicationSession(environmentURI, identity['clientID'], tenantID, identity['clientSecret'])
+                    for identity in identities]
+        return cls(sessions, concurrency)
+
+    def acquire(self) -> DataverseSession:
+        """
+        Returns the session with the most remaining budget that has a free slot, waiting for one if needed.
+        """
+        with self._available:
+            while True:
+                candidates = [session for session in self.sessions if self._in_use[id(session)] < self.concurrency]
+                if candidates:
+                    session = max(candidates, key=lambda s: (s.throttle.budget(), -self._in_use[id(s)]))
+                    self._in_use[id(session)] += 1
+                    return session
+                self._available.wait()
+
+    def release(self, session: DataverseSession):
+        with self._available:
+            self._in_use[id(session)] -= 1
+            self._available.notify()
+
+    @contextmanager
+    def session(self):
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def query(self, endpoint: str, query_params: dict = None, headers: dict = None):
+        with self.session() as session:
+            return session.query(endpoint, query_params, headers)
+
+    def download(self, endpoint: str, query_params: dict = None, sink=None):
+        with self.session() as session:
+            return session.download(endpoint, query_params, sink)
+
+    def fetch(self, entity_set_name: str, fetch_xml: str, page_size: int = 5000, sink=None):
+        with self.session() as session:
+            return session.fetch(entity_set_name, fetch_xml, page_size, sink)
+
+    def action(self, name: str, payload: dict = None):
+        with self.session() as session:
+            return session.action(name, payload)
+
+    def build_uri(self, endpoint: str, query_params: dict = None):
+        return self.sessions[0].build_uri(endpoint, query_params)
+
+    def mutate(self, entity_set_name: str, payloads: list = [], parse_response: bool = True, minimal: bool = False, sink=None,
+               method: str = 'POST', keys: list = None, if_match: str = None, progress: bool = True, chunk_size: int = 100):
+        """
+        Splits the payloads into chunks and sends them concurrently across the identities.
+        Results are returned, or written to the sink, in the original row order.
+        Progress is reported for the whole run as chunks complete rather than by each chunk.
+        """
+        timeStart = time.perf_counter()
+        compact = minimal or sink is not None
+
+        def run(first):
+            chunk_keys = keys[first:first + chunk_size] if keys is not None else None
+            with self.session() as session:
+                return session.mutate(entity_set_name, payloads[first:first + chunk_size], parse_response, compact, None, method,
+                                      chunk_keys, if_match, False)
+
+        processed = MutateResult(self.build_uri(entity_set_name)) if compact else []
+        offset = 0
+        failures = 0
+        percent_complete = 0
+        with ThreadPoolExecutor(max_workers=len(self.sessions) * self.concurrency) as executor:
+            for result in executor.map(run, range(0, len(payloads), chunk_size)):
+                if sink is not None:
+                    result.write_to(sink, offset)
+                else:
+                    processed.extend(result)
+                offset += len(result)
+                failures += count_failures(result)
+                if progress and round(offset / len(payloads) * 100, 0) != percent_complete:
+                    percent_complete = round(offset / len(payloads) * 100, 0)
+                    print(f"{percent_complete}% complete")
+
+        if progress:
+            print(f'{len(payloads) - failures} UPDATES MADE OF {len(payloads)} EXPECTED UPDATES. {failures} FAILURES.')
+            print(f'POOL IMPORT OF {len(payloads)} ROWS ACROSS {len(self.sessions)} IDENTITIES TOOK: {round(time.perf_counter() - timeStart,0)} SECONDS ')
+
+        if sink is not None:
+            sink.flush()
+            return sink
+        return processed
+
+    def batch(self, operations: list, batch_size: int = 1000, sink=None):
+        """
+        Sends each $batch request through the identity with the most remaining budget, several at a time.
+        """
+        def run(first):
+            with self.session() as session:
+                results = session.batch(operations[first:first + batch_size], batch_size)
+            for result in results:
+                result['row'] += first
+            return results
+
+        processed = []
+        with ThreadPoolExecutor(max_workers=len(self.sessions) * self.concurrency) as executor:
+            for results in executor.map(run, range(0, len(operations), batch_size)):
+                if sink is not None:
+                    sink.write_many(results)
+                else:
+                    processed.extend(results)
+
+        if sink is not None:
+            sink.flush()
+            return sink
+        return processed
+
+    def __repr__(self):
+        return f"SessionPool(identities={len(self.sessions)}, throttles={[session.throttle for session in self.sessions]})"
+
+def count_failures(result) -> int:
+    if isinstance(result, MutateResult):
+        return result.failures
+    return sum(payload['_REQUEST']['HTTP_RESPONSE'] not in (200, 201, 204) for payload in result)
@@ -0,0 +1,312 @@
+from datetime import date, datetime, timedelta, timezone
+import requests
+from dataverse._requests.metadata import ColumnDef, EntityDef, EntityDict, OPTION_SET_TYPES
+from ._requests.fetchxml import build_aggregate_fetch, build_fetch
+from .sessions import DataverseSession
+
+LOOKUP_TYPES = {'Lookup', 'Customer', 'Owner'}
+OPERATORS = {'eq', 'ne', 'gt', 'ge', 'lt', 'le'}
+FUNCTIONS = {'contains', 'startswith', 'endswith'}
+# types whose OData literals are written without quotes
+UNQUOTED_TYPES = LOOKUP_TYPES | {'Uniqueidentifier', 'DateTime'}
+AGGREGATE_METHODS = {'sum', 'average', 'min', 'max', 'countdistinct'}
+# how partial results of each method are combined when an aggregation is split
+COMBINE_METHODS = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+AGGREGATE_LIMIT_ERROR = 'AggregateQueryRecordLimit'
+
+def get_property_name(column: ColumnDef) -> str:
+    """
+    Returns the name a column is read and filtered by. Lookups are exposed as _<logical name>_value.
+    """
+    if column.attribute_type in LOOKUP_TYPES:
+        return f'_{column.logical_name}_value'
+    return column.logical_name
+
+def format_datetime(value: date) -> str:
+    """
+    Formats a date as YYYY-MM-DD and a datetime as ISO 8601 in UTC with a Z suffix. Naive datetimes are taken to be UTC.
+    """
+    if not isinstance(value, datetime):
+        return value.isoformat()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def format_value(value) -> str:
+    """
+    Formats a Python value as an OData literal.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, date):
+        return format_datetime(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+class Query:
+    """
+    Builds an OData query against one entity, using display or logical names for its columns.
+    $select, $filter, $expand, $orderby and $top are always sent to the server, so only the
+    requested columns and rows are transferred.
+    """
+    def __init__(self, session: DataverseSession, entities: EntityDict, entity: EntityDef):
+        self.session = session
+        self.entities = entities
+        self.entity = entity
+        self._select = []
+        self._filters = []
+        self._expand = []
+        self._order_by = []
+        self._top = None
+        self._names = {}
+        self._conditions = []
+        self._raw_filters = False
+        self._groups = []
+        self._aggregations = []
+
+    def select(self, *columns: str):
+        """
+        Adds columns to $select.
+        """
+        for name in columns:
+            column = self.entity.get_column(name)
+            property_name = get_property_name(column)
+            self._select.append(property_name)
+            self._names[property_name] = column.display_name
+        return self
+
+    def where(self, column_name: str, operator: str, value):
+        """
+        Adds a condition to $filter, e.g. where('Penalty Amount', 'gt', 100) or where('Name', 'contains', 'Care').
+        Conditions are combined with 'and'. Choice labels are converted to their option values.
+        """
+        column = self.entity.get_column(column_name)
+        property_name = get_property_name(column)
+        if column.attribute_type in OPTION_SET_TYPES and value is not None:
+            value = column.get_option_value(value)
+        if isinstance(value, date):
+            value = format_datetime(value)
+        literal = str(value) if column.attribute_type in UNQUOTED_TYPES and value is not None else format_value(value)
+
+        self._conditions.append((column.logical_name, operator, value))
+        if operator in OPERATORS:
+            self._filters.append(f'{property_name} {operator} {literal}')
+        elif operator in FUNCTIONS:
+            self._filters.append(f'{operator}({property_name},{literal})')
+        else:
+            raise ValueError(f"Unsupported operator '{operator}'. Use one of: {', '.join(sorted(OPERATORS | FUNCTIONS))}.")
+        return self
+
+    def filter(self, expression: str):
+        """
+        Adds a raw OData expression to $filter.
+        """
+        self._filters.append(f'({expression})')
+        self._raw_filters = True
+        return self
+
+    def group_by(self, *columns: str):
+        """
+        Groups an aggregation by the given columns.
+        """
+        for name in columns:
+            column = self.entity.get_column(name)
+            self._groups.append(column)
+            self._names[get_property_name(column)] = column.display_name
+        return self
+
+    def aggregate(self, alias: str, column_name: str, method: str):
+        """
+        Adds an aggregate of a column, e.g. aggregate('total', 'Penalty Amount', 'sum').
+        method is one of sum, average, min, max or countdistinct.
+        """
+        if method not in AGGREGATE_METHODS:
+            raise ValueError(f"Unsupported aggregate '{method}'. Use one of: {', '.join(sorted(AGGREGATE_METHODS))}.")
+        self._aggregations.append((alias, self.entity.get_column(column_name), method))
+        return self
+
+    def count(self, alias: str = 'count'):
+        """
+        Adds a count of the rows in each group.
+        """
+        self._aggregations.append((alias, None, 'count'))
+        return self
+
+    @property
+    def is_aggregate(self) -> bool:
+        return bool(self._groups or self._aggregations)
+
+    def expand(self, column_name: str, *columns: str):
+        """
+        Expands a lookup column, selecting the given columns of the related entity.
+        """
+        column = self.entity.get_column(column_name)
+        if column.attribute_type not in LOOKUP_TYPES:
+            raise ValueError(f"Column '{column.display_name}' is not a lookup and cannot be expanded.")
+        related_entity = self.entities.get_entity(column.related)
+        related_columns = [get_property_name(related_entity.get_column(name)) for name in columns]
+        self._expand.append(f'{column.schema_name}($select={",".join(related_columns)})' if related_columns else column.schema_name)
+        return self
+
+    def order_by(self, column_name: str, descending: bool = False):
+        """
+        Adds a column to $orderby.
+        """
+        property_name = get_property_name(self.entity.get_column(column_name))
+        self._order_by.append(f'{property_name} desc' if descending else property_name)
+        return self
+
+    def top(self, count: int):
+        """
+        Limits the number of rows returned.
+        """
+        self._top = count
+        return self
+
+    def to_params(self) -> dict:
+        """
+        Returns the query options to send.
+        """
+        if self.is_aggregate:
+            if self._select or self._expand or self._order_by or self._top is not None:
+                raise ValueError('select(), expand(), order_by() and top() cannot be combined with group_by(), aggregate() or count().')
+            return {'$apply': self._build_apply()}
+
+        params = {}
+        if self._select:
+            params['$select'] = ','.join(self._select)
+        if self._filters:
+            params['$filter'] = ' and '.join(self._filters)
+        if self._expand:
+            params['$expand'] = ','.join(self._expand)
+        if self._order_by:
+            params['$orderby'] = ','.join(self._order_by)
+        if self._top is not None:
+            params['$top'] = str(self._top)
+        return params
+
+    def _build_apply(self) -> str:
+        transformations = []
+        if self._filters:
+            transformations.append(f"filter({' and '.join(self._filters)})")
+
+        aggregates = [f'$count as {alias}' if column is None else f'{get_property_name(column)} with {method} as {alias}'
+                      for alias, column, method in self._aggregations]
+        if self._groups:
+            groups = ','.join(get_property_name(column) for column in self._groups)
+            transformations.append(f"groupby(({groups}),aggregate({','.join(aggregates)}))" if aggregates else f'groupby(({groups}))')
+        else:
+            transformations.append(f"aggregate({','.join(aggregates)})")
+        return '/'.join(transformations)
+
+    def to_fetch_xml(self, *columns: str) -> str:
+        """
+        Returns the where() conditions as FetchXML reading the given columns, or every column when none are given.
+        """
+        if self._raw_filters:
+            raise ValueError('Queries with raw filter expressions cannot be converted to FetchXML. Use where() instead.')
+        if self.is_aggregate:
+            raise ValueError('Aggregate queries cannot be converted to FetchXML.')
+        return build_fetch(self.entity.logical_name, self._conditions, [self.entity.get_column(name).logical_name for name in columns])
+
+    def fetch(self, sink=None):
+        """
+        Runs the query, following every page. Rows are written to the sink when one is given, otherwise returned as a list.
+        """
+        return self.session.download(self.entity.entity_set_name, self.to_params(), sink)
+
+    def to_dataframe(self):
+        """
+        Runs the query and returns the rows as a DataFrame with selected columns named by their display names.
+        """
+        import pandas as pd
+        try:
+            df = pd.DataFrame(self.fetch())
+        except requests.HTTPError as error:
+            if not self.is_aggregate or AGGREGATE_LIMIT_ERROR not in str(error):
+                raise
+            print('Aggregate limit exceeded. Splitting the aggregation by Created On.')
+            df = self._aggregate_in_parts()
+        return df.rename(columns=self._names)
+
+    def _aggregate_in_parts(self):
+        """
+        Runs the aggregation as FetchXML over Created On ranges, halving any range that is over the
+        aggregate row limit, then combines the partial results.
+        """
+        import pandas as pd
+        if self._raw_filters:
+            raise ValueError('Aggregations with raw filter expressions cannot be split. Use where() instead.')
+        if any(method == 'countdistinct' for _, _, method in self._aggregations):
+            raise ValueError('countdistinct aggregations cannot be combined across split queries.')
+
+        groups = [(column.logical_name, column.logical_name) for column in self._groups]
+        aggregations = []
+        combine = {}
+        for alias, column, method in self._aggregations:
+            if column is None:
+                aggregations.append((f'{self.entity.logical_name}id', 'count', alias))
+                combine[alias] = 'sum'
+            elif method == 'average':
+                # averages are rebuilt from the sum and count of every part
+                aggregations.append((column.logical_name, 'sum', f'{alias}_sum'))
+                aggregations.append((column.logical_name, 'countcolumn', f'{alias}_count'))
+                combine[f'{alias}_sum'] = 'sum'
+                combine[f'{alias}_count'] = 'sum'
+            else:
+                aggregations.append((column.logical_name, method, alias))
+                combine[alias] = COMBINE_METHODS[method]
+
+        first = self._get_created_on(descending=False)
+        if first is None:
+            return pd.DataFrame(columns=[get_property_name(column) for column in self._groups] + [alias for alias, _, _ in self._aggregations])
+        last = self._get_created_on(descending=True)
+
+        parts = []
+        self._aggregate_range(groups, aggregations, first, last + timedelta(seconds=1), parts)
+
+        df = pd.DataFrame(parts)
+        group_names = [alias for _, alias in groups]
+        if group_names:
+            df = df.groupby(group_names, dropna=False).agg(combine).reset_index()
+        else:
+            df = df.agg(combine).to_frame().T
+
+        for alias, column, method in self._aggregations:
+            if method == 'average':
+                df[alias] = df[f'{alias}_sum'] / df[f'{alias}_count']
+                df = df.drop(columns=[f'{alias}_sum', f'{alias}_count'])
+        return df.rename(columns={column.logical_name: get_property_name(column) for column in self._groups})
+
+    def _aggregate_range(self, groups: list, aggregations: list, start: datetime, end: datetime, parts: list):
+        conditions = self._conditions + [
+            ('createdon', 'ge', format_datetime(start)),
+            ('createdon', 'lt', format_datetime(end))
+        ]
+        fetch_xml = build_aggregate_fetch(self.entity.logical_name, groups, aggregations, conditions)
+        try:
+            response = self.session.query(self.entity.entity_set_name, {'fetchXml': fetch_xml})
+            parts.extend(response.json()['value'])
+        except requests.HTTPError as error:
+            middle = (start + (end - start) / 2).replace(microsecond=0)
+            if AGGREGATE_LIMIT_ERROR not in str(error) or middle <= start:
+                raise
+            self._aggregate_range(groups, aggregations, start, middle, parts)
+            self._aggregate_range(groups, aggregations, middle, end, parts)
+
+    def _get_created_on(self, descending: bool):
+        """
+        Returns the first or last Created On value among the rows matching the conditions.
+        """
+        query = Query(self.session, self.entities, self.entity).select('createdon').order_by('createdon', descending).top(1)
+        query._filters = self._filters
+        rows = self.session.query(self.entity.entity_set_name, query.to_params()).json()['value']
+        if not rows:
+            return None
+        return datetime.fromisoformat(rows[0]['createdon'].replace('Z', '+00:00'))
+
+    def __repr__(self):
+        return f"Query(entity_set_name={self.entity.entity_set_name}, params={self.to_params()})"
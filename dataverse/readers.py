@@ -0,0 +1,149 @@
+from decimal import Decimal, InvalidOperation
+import pandas as pd
+from ._requests.metadata import ColumnDef, EntityDef, OPTION_SET_TYPES
+from .columnar import DATETIME_FORMAT
+
+# pandas dtypes used to parse each Dataverse attribute type
+DTYPES = {
+    'String': 'string',
+    'Memo': 'string',
+    'Lookup': 'string',
+    'Customer': 'string',
+    'Owner': 'string',
+    'Uniqueidentifier': 'string',
+    'EntityName': 'string',
+    'Integer': 'Int64',
+    'BigInt': 'Int64',
+    'Picklist': 'string',
+    'State': 'string',
+    'Status': 'string',
+    'Money': 'string',
+    'Decimal': 'string',
+    'Double': 'Float64',
+    'Boolean': 'string',
+    'DateTime': 'string'
+}
+
+BOOLEAN_VALUES = {'true': True, 'false': False, 'yes': True, 'no': False, '1': True, '0': False}
+# an optional sign or accounting brackets, a currency symbol or code either side, and a number
+# written with comma thousands separators and a point for decimals, e.g. "$1,100.00", "(50.00)" or "-12 EUR"
+MONEY_PATTERN = (r'^\s*(?P<open>\()?\s*(?P<sign>-)?\s*[^\d\s().,\-]*\s*(?P<inner_sign>-)?\s*'
+                 r'(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+)\s*[^\d\s().,\-]*\s*(?P<close>\))?\s*$')
+
+def get_columns(entity: EntityDef, headers) -> dict:
+    """
+    Maps each CSV header to its column definition. Unknown headers are left out.
+    """
+    columns = {}
+    for header in headers:
+        try:
+            columns[header] = entity.get_column(header)
+        except KeyError:
+            continue
+    return columns
+
+def build_dtypes(columns: dict) -> dict:
+    """
+    Builds the read_csv dtype map from the column attribute types. Columns of unknown type are read as strings
+    so keys that look numeric or like GUIDs are never coerced.
+    """
+    return {header: DTYPES.get(column.attribute_type, 'string') for header, column in columns.items()}
+
+def coerce_options(series: pd.Series, column: ColumnDef) -> pd.Series:
+    """
+    Maps choice labels and numeric codes to option values. Raises a KeyError listing any label
+    that is not an option of the column.
+    """
+    if column.options is None:
+        return pd.to_numeric(series).astype('Int64')
+
+    lookup = {**column.options, **{str(value): value for value in column.options.values()}}
+    values = series.str.strip().map(lookup).astype('Int64')
+    unknown = series[series.notna() & values.isna()].unique()
+    if len(unknown) > 0:
+        raise KeyError(f"Options {list(unknown)} not found in column '{column.display_name}'.")
+    return values
+
+def raise_unparsed(series: pd.Series, values: pd.Series, column: ColumnDef, kind: str):
+    """
+    Raises a ValueError listing every value that was present in the CSV but could not be converted.
+    """
+    unparsed = series[series.notna() & values.isna()].unique()
+    if len(unparsed) > 0:
+        raise ValueError(f"Values {list(unparsed)} in column '{column.display_name}' are not valid {kind} values.")
+
+def coerce_boolean(series: pd.Series, column: ColumnDef) -> pd.Series:
+    values = series.str.strip().str.lower().map(BOOLEAN_VALUES).astype('boolean')
+    raise_unparsed(series, values, column, 'Boolean')
+    return values
+
+def to_decimal(text: str):
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+def to_decimals(series: pd.Series) -> pd.Series:
+    # each distinct value is parsed once, and missing or unparsed values become None
+    parsed = {text: to_decimal(text) for text in series.dropna().unique()}
+    return series.astype(object).map(parsed).astype(object).where(series.notna(), None)
+
+def coerce_decimal(series: pd.Series, column: ColumnDef) -> pd.Series:
+    """
+    Parses Decimal values to decimal.Decimal, so they are sent with every digit of the CSV rather than as floats.
+    """
+    values = to_decimals(series.str.strip())
+    raise_unparsed(series, values, column, 'Decimal')
+    return values
+
+def coerce_money(series: pd.Series, column: ColumnDef) -> pd.Series:
+    """
+    Parses currency values such as "$1,100.00" or "(50.00)" to decimal.Decimal. Values in any other format, including
+    ones using a comma for decimals, raise a ValueError rather than being read as a different amount.
+    """
+    parts = series.str.extract(MONEY_PATTERN)
+    balanced = parts['open'].isna() == parts['close'].isna()
+    numbers = parts['number'].where(balanced).str.replace(',', '', regex=False)
+    negative = parts['open'].notna() | parts['sign'].notna() | parts['inner_sign'].notna()
+    values = to_decimals(numbers.mask(negative, '-' + numbers))
+    raise_unparsed(series, values, column, 'Money')
+    return values
+
+def coerce_column(series: pd.Series, column: ColumnDef) -> pd.Series:
+    """
+    Converts a parsed column to the value Dataverse expects, one vectorised operation per column.
+    """
+    attribute_type = column.attribute_type
+    if attribute_type in OPTION_SET_TYPES:
+        return coerce_options(series, column)
+    if attribute_type == 'Boolean':
+        return coerce_boolean(series, column)
+    if attribute_type == 'Money':
+        return coerce_money(series, column)
+    if attribute_type == 'Decimal':
+        return coerce_decimal(series, column)
+    if attribute_type == 'DateTime':
+        return pd.to_datetime(series, utc=True).dt.strftime(DATETIME_FORMAT)
+    return series
+
+def read_csv(csv: str, entity: EntityDef) -> pd.DataFrame:
+    """
+    Reads a CSV using the entity metadata to type each column before parsing.
+    """
+    headers = pd.read_csv(csv, nrows=0).columns
+    columns = get_columns(entity, headers)
+    dtypes = build_dtypes(columns)
+    # headers that match no column are kept as text and rejected when the payload is built
+    dtypes.update({header: 'string' for header in headers if header not in dtypes})
+
+    df = pd.read_csv(csv, dtype=dtypes)
+    for header, column in columns.items():
+        df[header] = coerce_column(df[header], column)
+    return df
+
+def to_records(df: pd.DataFrame) -> list:
+    """
+    Converts a typed DataFrame to a list of records holding plain Python values, with None for missing values.
+    """
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
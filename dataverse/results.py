@@ -0,0 +1,85 @@
+import uuid
+from array import array
+
+NO_ID = bytes(16)
+
+class MutateResult:
+    """
+    Compact, columnar outcome of a mutate run.
+    Status codes and record ids are stored per row in flat arrays, error messages only for rows that failed.
+    """
+    def __init__(self, request_uri: str):
+        self.request_uri = request_uri
+        self.status_codes = array('H')
+        self.errors = {}
+        self._ids = bytearray()
+
+    def append(self, status_code: int, entity_id: str = None, error: str = None):
+        """
+        Records the outcome of the next row.
+        """
+        if error is not None:
+            self.errors[len(self.status_codes)] = error
+        self.status_codes.append(status_code)
+        self._ids += uuid.UUID(entity_id).bytes if entity_id else NO_ID
+
+    def extend(self, other: 'MutateResult'):
+        """
+        Appends the rows of another result, e.g. one chunk of a run split across sessions.
+        """
+        offset = len(self.status_codes)
+        self.errors.update({offset + row: error for row, error in other.errors.items()})
+        self.status_codes.extend(other.status_codes)
+        self._ids += other._ids
+
+    @property
+    def ids(self):
+        """
+        The id of each created record, or None where the row failed.
+        """
+        return [None if self._ids[i:i + 16] == NO_ID else str(uuid.UUID(bytes=bytes(self._ids[i:i + 16])))
+                for i in range(0, len(self._ids), 16)]
+
+    @property
+    def failures(self) -> int:
+        return len(self.errors)
+
+    @property
+    def successes(self) -> int:
+        return len(self.status_codes) - len(self.errors)
+
+    def write_to(self, sink, offset: int = 0, index: list = None):
+        """
+        Writes a row, status_code, id and error record per row to a result sink, numbering rows from offset.
+        When an index is given, each row is written as its label in the index instead, starting at position offset.
+        """
+        for row, (status_code, entity_id) in enumerate(zip(self.status_codes, self.ids)):
+            sink.write({
+                'row': offset + row if index is None else index[offset + row],
+                'status_code': status_code,
+                'id': entity_id,
+                'error': self.errors.get(row)
+            })
+
+    def to_dataframe(self):
+        """
+        Converts the result to a DataFrame with status_code, id and error columns.
+        """
+        import pandas as pd
+        df = pd.DataFrame({'status_code': self.status_codes, 'id': self.ids})
+        df['error'] = pd.Series(self.errors, index=df.index, dtype=object)
+        return df
+
+    def __len__(self):
+        return len(self.status_codes)
+
+    def __repr__(self):
+        return f"MutateResult(rows={len(self)}, successes={self.successes}, failures={self.failures})"
+
+def entity_id_from_uri(entity_uri: str):
+    """
+    Extracts the record id from an OData-EntityId header such as .../accounts(00000000-0000-0000-0000-000000000001).
+    """
+    if not entity_uri or not entity_uri.endswith(')'):
+        return None
+    return entity_uri[entity_uri.rindex('(') + 1:-1]
@@ -1,10 +1,16 @@
 from datetime import datetime, timedelta
 import os
 import time
-import msal
 import requests
 import json
 import urllib
+import uuid
+from . import encoding
+from .results import MutateResult, entity_id_from_uri
+from .cache import DEFAULT_MAX_AGE, ReadCache
+from .throttle import ThrottleState
+from ._requests.batch import build_batch_body, parse_batch_response
+from ._requests.fetchxml import MORE_RECORDS_ANNOTATION, PAGING_COOKIE_ANNOTATION, PREFER_PAGING_ANNOTATIONS, get_paging_cookie, set_paging
 
 AUTHORITY_BASE = "https://login.microsoftonline.com/"
 SCOPE_SUFFIX = "user_impersonation"
@@ -14,22 +20,113 @@ class DataverseSession(requests.Session):
     def __init__(self, environmentURI: str) -> None:
         super().__init__()
         self.environmentURI = environmentURI
+        self.cache = None
+        self.throttle = ThrottleState()
+        self.max_retries = 3
 
-    def query(self, endpoint: str, query_params: dict = None):
-        uri = self.build_uri(endpoint, query_params)
+    def send(self, request, **kwargs):
+        """
+        Sends a request, waiting out service protection limits and retrying requests rejected with 429.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.throttle.wait()
+            response = super().send(request, **kwargs)
+            self.throttle.update(response)
+            if response.status_code != 429:
+                break
+        return response
+
+    def enable_cache(self, max_entries: int = 256, directory: str = None, max_age: float = DEFAULT_MAX_AGE):
+        """
+        Turns on the read-through cache for query, download and fetch.
+        Collection reads carry no ETag and are served from the cache for max_age seconds, so set max_age
+        to how stale reference data may be. Pass a directory to also keep responses on disk between runs.
+        """
+        self.cache = ReadCache(max_entries, directory, max_age)
+        return self.cache
+
+    def query(self, endpoint: str, query_params: dict = None, headers: dict = None):
+        return self._get(self.build_uri(endpoint, query_params), headers)
+
+    def download(self, endpoint: str, query_params: dict = None, sink=None):
+        """
+        Reads every page of a query by following @odata.nextLink.
+        Rows are written to the sink page by page when one is given, otherwise they are returned as a list.
+        """
+        rows = []
+        response = self.query(endpoint, query_params)
+        while True:
+            page = encoding.loads(response.content)
+            if sink is not None:
+                sink.write_many(page.get('value', []))
+            else:
+                rows.extend(page.get('value', []))
+
+            next_link = page.get('@odata.nextLink')
+            if not next_link:
+                break
+            response = self._get(next_link)
 
+        if sink is not None:
+            sink.flush()
+            return sink
+        return rows
+
+    def fetch(self, entity_set_name: str, fetch_xml: str, page_size: int = 5000, sink=None):
+        """
+        Runs a FetchXML query page by page, sending the paging cookie of each page with the request for the next.
+        Rows are written to the sink page by page when one is given, otherwise they are returned as a list.
+        """
+        rows = []
+        page = 1
+        paging_cookie = None
+        while True:
+            uri = self.build_uri(entity_set_name, {'fetchXml': set_paging(fetch_xml, page, page_size, paging_cookie)})
+            result = encoding.loads(self._get(uri, {'Prefer': PREFER_PAGING_ANNOTATIONS}).content)
+            if sink is not None:
+                sink.write_many(result.get('value', []))
+            else:
+                rows.extend(result.get('value', []))
+
+            if not result.get(MORE_RECORDS_ANNOTATION):
+                break
+            annotation = result.get(PAGING_COOKIE_ANNOTATION)
+            paging_cookie = get_paging_cookie(annotation) if annotation else None
+            page += 1
+
+        if sink is not None:
+            sink.flush()
+            return sink
+        return rows
+
+    def _get(self, uri: str, headers: dict = None):
+        if self.cache is not None:
+            return self.cache.get(self, uri, headers)
+        return self._send_get(uri, headers)
+
+    def _send_get(self, uri: str, headers: dict = None):
         print(f'Sending GET request to: {uri}')
-        response = super().get(uri)
+        response = super().get(uri, headers=headers)
 
-        if response.status_code not in [200, 201]:
+        if response.status_code not in [200, 201, 304]:
             self._handle_response_error(response)
         
         print("Request successful")
         return response
 
-    def mutate(self, entity_set_name: str, payloads: list = []):
-        self.headers.update({"Prefer" : "return=representation"})
-
+    def mutate(self, entity_set_name: str, payloads: list = [], parse_response: bool = True, minimal: bool = False, sink=None,
+               method: str = 'POST', keys: list = None, if_match: str = None, progress: bool = True):
+        """
+        POSTs each payload to the entity set, or sends it with another method to the record addressed by its key
+        when keys are given, e.g. PATCH to accounts(accountnumber='A1'). Pass if_match='*' so a PATCH only updates
+        records that already exist. Payloads are encoded straight to bytes and sent
+        on copies of one prepared request, so headers and the URI are only built once.
+        Set parse_response to False to skip decoding the response bodies.
+        Set minimal to True to send return=minimal and get a compact MutateResult instead of the
+        annotated payloads; new ids are then read from the OData-EntityId header.
+        When a sink is given, the outcome of each row is written to it instead of being kept in memory
+        and the sink is returned. Set progress to False to leave out the progress and summary lines.
+        """
         # the post uri
         row = 0
         successful_updates = 0
@@ -39,49 +136,148 @@ class DataverseSession(requests.Session):
         timeStart = time.perf_counter()
 
         request_uri = self.build_uri(entity_set_name)
-        
-        processed = []  
+        headers = {
+            "Prefer": "return=minimal" if minimal else "return=representation",
+            "Content-Type": "application/json; charset=utf-8"
+        }
+        if if_match is not None:
+            headers["If-Match"] = if_match
+        template = self._prepare_template(method, request_uri, headers)
+
+        processed = MutateResult(request_uri) if minimal else []
         for payload in payloads:
-            req = requests.Request('POST', request_uri, json=payload, headers = self.headers).prepare()
+            req = template.copy()
+            if keys is not None:
+                req.prepare_url(f'{request_uri}({keys[row]})', None)
+            req.prepare_body(encoding.dumps(payload), None)
             r = self.send(req)
-            payload['_REQUEST'] = {
-                'REQUEST_URI': request_uri,
-                'HTTP_RESPONSE': r.status_code,
-                'HTTP_CONTENT': json.loads(r.content.decode('utf-8'))
-            }
+            succeeded = r.status_code in [200, 201, 204]
+
+            if sink is not None:
+                sink.write({
+                    'row': row,
+                    'status_code': r.status_code,
+                    'id': entity_id_from_uri(r.headers.get('OData-EntityId')) if succeeded else None,
+                    'error': None if succeeded else self._error_message(r)
+                })
+            elif minimal:
+                if succeeded:
+                    processed.append(r.status_code, entity_id_from_uri(r.headers.get('OData-EntityId')))
+                else:
+                    processed.append(r.status_code, error=self._error_message(r))
+            else:
+                payload['_REQUEST'] = {
+                    'REQUEST_URI': req.url,
+                    'HTTP_RESPONSE': r.status_code,
+                    'HTTP_CONTENT': encoding.loads(r.content) if parse_response and r.content else None
+                }
+                processed.append(payload)
             
-            if r.status_code != 201:
+            if not succeeded:
                 failures += 1
 
             else:
                 successful_updates +=1 
 
             row += 1
-            if round(row/expected_updates * 100,0) != percent_complete:
+            if progress and round(row/expected_updates * 100,0) != percent_complete:
                 percent_complete = round(row/expected_updates * 100,0)
                 print(f"{percent_complete}% complete")
 
-            processed.append(payload)
-
-        print(f'{successful_updates} UPDATES MADE OF {expected_updates} EXPECTED UPDATES. {failures} FAILURES.') 
-        print(f'IMPORTING TOOK: {round(time.perf_counter() - timeStart,0)} SECONDS ')
+        if progress:
+            print(f'{successful_updates} UPDATES MADE OF {expected_updates} EXPECTED UPDATES. {failures} FAILURES.') 
+            print(f'IMPORTING TOOK: {round(time.perf_counter() - timeStart,0)} SECONDS ')
 
+        if sink is not None:
+            sink.flush()
+            return sink
         return processed
     
+    def batch(self, operations: list, batch_size: int = 1000, sink=None):
+        """
+        Sends (method, endpoint, payload) operations through $batch, up to batch_size operations per request.
+        Processing continues past failed operations and one result is recorded per operation.
+        When a sink is given, results are written to it instead of being kept in memory and the sink is returned.
+        """
+        batch_uri = self.build_uri('$batch')
+        results = []
+        failures = 0
+        timeStart = time.perf_counter()
+
+        for first in range(0, len(operations), batch_size):
+            chunk = operations[first:first + batch_size]
+            boundary = f'batch_{uuid.uuid4()}'
+            req = self._prepare_template('POST', batch_uri, {
+                "Prefer": "odata.continue-on-error",
+                "Content-Type": f'multipart/mixed; boundary="{boundary}"'
+            })
+            req.prepare_body(build_batch_body(boundary, [(method, self.build_uri(endpoint), payload) for method, endpoint, payload in chunk]), None)
+            r = self.send(req)
+
+            if r.status_code != 200:
+                self._handle_response_error(r)
+
+            for index, part in enumerate(parse_batch_response(r.headers.get('Content-Type', ''), r.content)):
+                succeeded = part['status_code'] < 400
+                content = encoding.loads(part['body']) if part['body'] else None
+                record = {
+                    'row': first + index,
+                    'status_code': part['status_code'],
+                    'id': entity_id_from_uri(part['headers'].get('OData-EntityId')),
+                    'error': None if succeeded else (content or {}).get('error', {}).get('message', part['body']),
+                    'content': content
+                }
+                if not succeeded:
+                    failures += 1
+
+                if sink is not None:
+                    sink.write(record)
+                else:
+                    results.append(record)
+
+            print(f"Operations {first} : {first + len(chunk) - 1} sent in batch. {failures} failures so far.")
+
+        print(f'BATCH TOOK: {round(time.perf_counter() - timeStart,0)} SECONDS ')
+
+        if sink is not None:
+            sink.flush()
+            return sink
+        return results
+
+    def action(self, name: str, payload: dict = None):
+        """
+        Calls an unbound action and returns its decoded response, or None when it returns no content.
+        """
+        req = self._prepare_template('POST', self.build_uri(name), {"Content-Type": "application/json; charset=utf-8"})
+        req.prepare_body(encoding.dumps(payload or {}), None)
+        r = self.send(req)
+
+        if r.status_code not in [200, 204]:
+            self._handle_response_error(r)
+        return encoding.loads(r.content) if r.content else None
+
     def accept(self, encoding: str):
         self.headers['ACCEPT'] = encoding
 
-    def build_uri(self, endpoint: str, query_params: dict = {}):
+    def build_uri(self, endpoint: str, query_params: dict = None):
         uri = f'{self.environmentURI.removesuffix("/")}/api/data/v9.2/{endpoint.removesuffix("/")}'
-        uri += '?' + '&'.join([f'{k}={urllib.parse.quote(v, safe="/")}' for k, v in query_params.items()])
+        uri += '?' + '&'.join([f'{k}={urllib.parse.quote(v, safe="/")}' for k, v in (query_params or {}).items()])
         return uri.rstrip('?')
 
-    def _handle_response_error(self, response):
+    def _prepare_template(self, method: str, uri: str, headers: dict = {}):
+        """
+        Prepares a request once so it can be copied for every payload sent to the same URI.
+        """
+        return requests.Request(method, uri, headers={**self.headers, **headers}).prepare()
+
+    def _error_message(self, response):
         try:
-            message = response.json().get('error', {}).get('message', '')
+            return response.json().get('error', {}).get('message', '')
         except json.JSONDecodeError:
-            message = response.text
-        raise requests.HTTPError(f'Error ({response.status_code}): {message}')
+            return response.text
+
+    def _handle_response_error(self, response):
+        raise requests.HTTPError(f'Error ({response.status_code}): {self._error_message(response)}')
 
 class DataverseSessions:
     @staticmethod
@@ -89,17 +285,15 @@ class DataverseSessions:
         token_file = f'{CACHE_DIR}/.token'
 
         # Check if token is recent
-        if os.path.exists(token_file):
-            last_modified_time = datetime.fromtimestamp(os.path.getmtime(token_file))
-            if datetime.now() - last_modified_time < timedelta(hours=1):
-                print("Token was fetched within the last hour. Returning cached token.")
-                with open(token_file, "r") as file:
-                    token = file.read()
-                    return DataverseSessions._create_dataverse_session(environmentURI, token)
+        token = DataverseSessions._read_cached_token(token_file)
+        if token is not None:
+            return DataverseSessions._create_dataverse_session(environmentURI, token)
 
         # Acquire new token
         scope = [environmentURI + '/' + SCOPE_SUFFIX]
         authority = AUTHORITY_BASE + tenantID
+        # msal is only needed when a new token is acquired, so it is not imported with the package
+        import msal
         app = msal.PublicClientApplication(clientID, authority=authority)
 
         print("A local browser window will open for you to sign in. CTRL+C to cancel.")
@@ -113,6 +307,42 @@ class DataverseSessions:
         else:
             DataverseSessions._handle_token_error(result)
 
+    @staticmethod
+    def getApplicationSession(environmentURI: str, clientID: str, tenantID: str, clientSecret: str):
+        """
+        Authenticates as an application user with a client secret. Tokens are cached per client,
+        so several identities can be used side by side in a SessionPool.
+        """
+        token_file = f'{CACHE_DIR}/.token_{clientID}'
+
+        token = DataverseSessions._read_cached_token(token_file)
+        if token is not None:
+            return DataverseSessions._create_dataverse_session(environmentURI, token)
+
+        scope = [environmentURI.removesuffix('/') + '/.default']
+        authority = AUTHORITY_BASE + tenantID
+        import msal
+        app = msal.ConfidentialClientApplication(clientID, authority=authority, client_credential=clientSecret)
+        result = app.acquire_token_for_client(scopes=scope)
+
+        if "access_token" in result:
+            print(f"Token received successfully for client {clientID}")
+            with open(token_file, "w") as file:
+                file.write(result["access_token"])
+            return DataverseSessions._create_dataverse_session(environmentURI, result["access_token"])
+        else:
+            DataverseSessions._handle_token_error(result)
+
+    @staticmethod
+    def _read_cached_token(token_file: str):
+        if os.path.exists(token_file):
+            last_modified_time = datetime.fromtimestamp(os.path.getmtime(token_file))
+            if datetime.now() - last_modified_time < timedelta(hours=1):
+                print("Token was fetched within the last hour. Returning cached token.")
+                with open(token_file, "r") as file:
+                    return file.read()
+        return None
+
     @staticmethod
     def _create_dataverse_session(environmentURI: str, token: str):
         session = DataverseSession(environmentURI)
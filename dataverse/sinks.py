@@ -0,0 +1,155 @@
+import csv
+import os
+from . import encoding
+
+class ResultSink:
+    """
+    Base class for result sinks. Records are written one at a time and flushed to disk
+    every flush_every records, so output costs constant memory and survives an interrupted run.
+    Use as a context manager so the sink is flushed and closed even when a run fails.
+    """
+    def __init__(self, path: str, flush_every: int = 1000):
+        self.path = path
+        self.flush_every = flush_every
+        self.rows_written = 0
+        self._pending = 0
+
+    def write(self, record: dict):
+        self._write(record)
+        self.rows_written += 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+
+    def _write(self, record: dict):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(path={self.path}, rows_written={self.rows_written})"
+
+class JsonLinesSink(ResultSink):
+    """
+    Writes each record as one line of JSON.
+    """
+    def __init__(self, path: str, flush_every: int = 1000):
+        super().__init__(path, flush_every)
+        self._file = open(path, "wb")
+
+    def _write(self, record: dict):
+        self._file.write(encoding.dumps(record) + b'\n')
+
+    def flush(self):
+        super().flush()
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+class CsvSink(ResultSink):
+    """
+    Writes records as CSV rows. The header is taken from the first record written.
+    """
+    def __init__(self, path: str, flush_every: int = 1000):
+        super().__init__(path, flush_every)
+        self._file = open(path, "w", newline='', encoding='utf-8')
+        self._writer = None
+
+    def _write(self, record: dict):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=list(record.keys()), extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow(record)
+
+    def flush(self):
+        super().flush()
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+# the fields of the records mutate writes, as pyarrow type names
+RESULT_SCHEMA = {
+    'row': 'int64',
+    'status_code': 'int32',
+    'id': 'string',
+    'error': 'string'
+}
+
+class ParquetSink(ResultSink):
+    """
+    Writes records to a Parquet file through pyarrow, one row group every flush_every records.
+    schema maps field names to pyarrow type names, e.g. RESULT_SCHEMA for mutate results. Without one,
+    the schema is inferred from the first row group, with fields that were empty throughout read as strings.
+    """
+    def __init__(self, path: str, flush_every: int = 10000, schema: dict = None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetSink requires pyarrow. Install it with 'pip install pyarrow'.")
+        super().__init__(path, flush_every)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._writer = None
+        self._rows = []
+        self._schema = pyarrow.schema([(name, pyarrow.type_for_alias(type_name)) for name, type_name in schema.items()]) if schema else None
+
+    def _write(self, record: dict):
+        self._rows.append(record)
+
+    def flush(self):
+        super().flush()
+        if not self._rows:
+            return
+        if self._writer is None:
+            schema = self._schema or self._infer_schema()
+            self._writer = self._pq.ParquetWriter(self.path, schema)
+        table = self._pa.Table.from_pylist(self._rows, schema=self._writer.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def _infer_schema(self):
+        # a field with no values in the first row group would be typed null and reject every later value
+        schema = self._pa.Table.from_pylist(self._rows).schema
+        return self._pa.schema([field.with_type(self._pa.string()) if self._pa.types.is_null(field.type) else field for field in schema])
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+SINKS = {
+    '.jsonl': JsonLinesSink,
+    '.csv': CsvSink,
+    '.parquet': ParquetSink
+}
+
+def open_sink(path: str, **kwargs) -> ResultSink:
+    """
+    Opens the sink matching the file extension of the given path.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SINKS:
+        raise ValueError(f"No result sink for '{extension}' files. Use one of: {', '.join(SINKS)}.")
+    return SINKS[extension](path, **kwargs)
@@ -0,0 +1,58 @@
+import threading
+import time
+
+BURST_REMAINING_HEADER = 'x-ms-ratelimit-burst-remaining-xrm-requests'
+TIME_REMAINING_HEADER = 'x-ms-ratelimit-time-remaining-xrm-requests'
+
+class ThrottleState:
+    """
+    Tracks the service protection budget of one identity from the rate limit headers Dataverse returns,
+    and the time to wait after a 429 Too Many Requests response.
+    """
+    def __init__(self):
+        self.burst_remaining = None
+        self.time_remaining = None
+        self.retry_at = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def update(self, response):
+        """
+        Records the budget reported by a response. A 429 pauses the identity for its Retry-After seconds.
+        """
+        with self._lock:
+            burst_remaining = response.headers.get(BURST_REMAINING_HEADER)
+            if burst_remaining is not None:
+                self.burst_remaining = int(burst_remaining)
+            time_remaining = response.headers.get(TIME_REMAINING_HEADER)
+            if time_remaining is not None:
+                self.time_remaining = float(time_remaining)
+
+            if response.status_code == 429:
+                self.throttled += 1
+                retry_after = float(response.headers.get('Retry-After', 5))
+                self.retry_at = max(self.retry_at, time.monotonic() + retry_after)
+
+    def wait(self):
+        """
+        Sleeps until the identity may send again.
+        """
+        delay = self.retry_at - time.monotonic()
+        if delay > 0:
+            print(f'Throttled by service protection limits. Waiting {round(delay, 1)} seconds.')
+            time.sleep(delay)
+
+    @property
+    def paused(self) -> bool:
+        return time.monotonic() < self.retry_at
+
+    def budget(self) -> float:
+        """
+        Returns the remaining burst budget, or infinity while it is unknown. Paused identities have no budget.
+        """
+        if self.paused:
+            return float('-inf')
+        return float('inf') if self.burst_remaining is None else self.burst_remaining
+
+    def __repr__(self):
+        return f"ThrottleState(burst_remaining={self.burst_remaining}, time_remaining={self.time_remaining}, throttled={self.throttled})"
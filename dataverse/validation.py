@@ -0,0 +1,118 @@
+import pandas as pd
+from ._requests.metadata import EntityDef, EntityDict
+from .query import LOOKUP_TYPES, format_value
+
+TEXT_TYPES = {'String', 'Memo'}
+NUMERIC_TYPES = {'Integer', 'BigInt', 'Decimal', 'Double', 'Money'}
+LOOKUP_CHECK_SIZE = 100
+# SystemRequired columns are filled in by the platform, so only business required columns are checked by default
+REQUIRED_LEVELS = {'ApplicationRequired'}
+
+class ValidationReport:
+    """
+    The outcome of validating a DataFrame against entity metadata.
+    valid holds the rows that can be sent, rejections one row per failed check with its row, column, reason and value.
+    """
+    def __init__(self, valid: pd.DataFrame, rejections: pd.DataFrame):
+        self.valid = valid
+        self.rejections = rejections
+
+    @property
+    def rejected_rows(self) -> int:
+        return self.rejections['row'].nunique()
+
+    def __repr__(self):
+        return f"ValidationReport(valid_rows={len(self.valid)}, rejected_rows={self.rejected_rows}, rejections={len(self.rejections)})"
+
+def check_column(series: pd.Series, column, required_levels=REQUIRED_LEVELS, operation: str = 'create') -> list:
+    """
+    Returns (mask, reason) pairs for every metadata check the values of one column fail.
+    """
+    present = series.notna()
+    checks = []
+    if not (column.valid_for_update if operation == 'update' else column.valid_for_create):
+        checks.append((present, f"Column '{column.display_name}' cannot be set on {operation}"))
+    if column.required_level in required_levels:
+        checks.append((~present, f"Column '{column.display_name}' is required"))
+    if column.attribute_type in TEXT_TYPES and column.max_length:
+        checks.append((series.astype('string').str.len().gt(column.max_length).fillna(False), f"Longer than {column.max_length} characters"))
+    if column.attribute_type in NUMERIC_TYPES:
+        # lists and DataFrames given directly may hold numbers as text
+        numbers = pd.to_numeric(series, errors='coerce')
+        checks.append((present & numbers.isna(), "Not a number"))
+        if column.min_value is not None:
+            checks.append((numbers.lt(column.min_value).fillna(False), f"Less than the minimum of {column.min_value}"))
+        if column.max_value is not None:
+            checks.append((numbers.gt(column.max_value).fillna(False), f"Greater than the maximum of {column.max_value}"))
+    return checks
+
+def check_lookup(series: pd.Series, column, entities: EntityDict, session=None) -> list:
+    """
+    Checks that a lookup targets an entity in the metadata and, when a session is given, that every
+    referenced key exists. Keys are looked up LOOKUP_CHECK_SIZE at a time with only the key column selected.
+    """
+    present = series.notna()
+    try:
+        related_entity = entities.get_entity(column.related)
+    except KeyError:
+        return [(present, f"Lookup target '{column.related}' is not in the entity metadata")]
+    if session is None:
+        return []
+
+    keys = series[present].astype(str).unique().tolist()
+    found = set()
+    for first in range(0, len(keys), LOOKUP_CHECK_SIZE):
+        chunk = keys[first:first + LOOKUP_CHECK_SIZE]
+        values = ','.join(format_value(key) for key in chunk)
+        rows = session.download(related_entity.entity_set_name, {
+            "$select": related_entity.key_column,
+            "$filter": f"Microsoft.Dynamics.CRM.In(PropertyName='{related_entity.key_column}',PropertyValues=[{values}])"
+        })
+        found.update(str(row[related_entity.key_column]) for row in rows)
+    return [(present & ~series.astype(str).isin(found), f"No '{related_entity.display_name}' record with this key")]
+
+def validate(df: pd.DataFrame, entity: EntityDef, entities: EntityDict, session=None, required_levels=REQUIRED_LEVELS,
+             operation: str = 'create', key_column=None) -> ValidationReport:
+    """
+    Checks a whole DataFrame against the entity metadata before anything is sent: unknown headers,
+    required columns, maximum lengths, numeric ranges and lookup targets.
+    Each check runs once per column over all rows. Pass a session to also confirm that lookup keys exist.
+    With operation set to 'update', columns are checked against IsValidForUpdate and required columns
+    may be left out, since a PATCH only changes the columns it sends. The key_column addressing each record
+    is not sent in the body, so it is only checked for missing values. Unknown columns are left out of the valid rows.
+    """
+    checks = []
+    known = set()
+    unknown = []
+    for header in df.columns:
+        try:
+            column = entity.get_column(header)
+        except KeyError:
+            checks.append((header, df[header].notna(), f"Unknown column '{header}' in '{entity.display_name}'"))
+            unknown.append(header)
+            continue
+        known.add(column.logical_name)
+        if column is key_column:
+            checks.append((header, df[header].isna(), f"Key column '{column.display_name}' is empty"))
+            continue
+        checks += [(header, mask, reason) for mask, reason in check_column(df[header], column, required_levels, operation)]
+        if column.attribute_type in LOOKUP_TYPES and column.related:
+            checks += [(header, mask, reason) for mask, reason in check_lookup(df[header], column, entities, session)]
+
+    # required columns missing from the headers reject every row of a create
+    for column in entity._columns.values():
+        if operation != 'create':
+            break
+        if column.required_level in required_levels and column.valid_for_create and column.logical_name not in known:
+            checks.append((column.display_name, pd.Series(True, index=df.index), f"Required column '{column.display_name}' is missing"))
+
+    rejections = [pd.DataFrame({'row': df.index[mask], 'column': header, 'reason': reason,
+                                'value': df[header][mask].astype(object).values if header in df.columns else None})
+                  for header, mask, reason in checks if mask.any()]
+    if rejections:
+        rejections = pd.concat(rejections, ignore_index=True)
+    else:
+        rejections = pd.DataFrame(columns=['row', 'column', 'reason', 'value'])
+    # unknown columns cannot be sent, even where every value is empty
+    valid = df.loc[~df.index.isin(rejections['row'])].drop(columns=unknown)
+    return ValidationReport(valid, rejections)
@@ -3,6 +3,7 @@ import datetime
 import os
 from dataverse.sessions import DataverseSessions 
 from dataverse.api import DataverseAPI
+from dataverse.sinks import JsonLinesSink
 
 # Parameters
 PathToEnvironmentJSON = "data-analytics-dev.json"
@@ -17,10 +18,8 @@ tenantID = config["tenantID"]
 api = DataverseAPI(DataverseSessions.getSession(environmentURI, clientID, tenantID))
 
 def create(entity_name, csv):
-    results = api.create(entity_name, csv)
-    
-    with open(f"{OUTPUT_PATH}/{entity_name}.json", "w") as outfile:
-        outfile.write(json.dumps(results))
+    with JsonLinesSink(f"{OUTPUT_PATH}/{entity_name}.jsonl") as sink:
+        api.create(entity_name, csv, minimal=True, sink=sink)
 
 # done: create('Survey List Sanction', 'data/surveys/Sanctions.csv')
 # done: create('Survey List Category', 'data/surveys/Survey List Category.csv')
@@ -0,0 +1,34 @@
+import pytest
+from dataverse._requests.metadata import ColumnDef, EntityDict
+from dataverse.api import DataverseAPI
+
+def make_column(display_name: str, logical_name: str, attribute_type: str, schema_name: str = None, **kwargs) -> ColumnDef:
+    return ColumnDef(display_name, logical_name, schema_name or logical_name, attribute_type, **kwargs)
+
+@pytest.fixture
+def entities() -> EntityDict:
+    entities = EntityDict()
+    entities.add_entity('Survey', 'able_survey', 'able_name', 'able_surveies', {
+        'Name': make_column('Name', 'able_name', 'String', max_length=10, required_level='ApplicationRequired'),
+        'Survey': make_column('Survey', 'able_surveyid', 'Uniqueidentifier', valid_for_update=False),
+        'Amount': make_column('Amount', 'able_amount', 'Money', min_value=0, max_value=1000),
+        'Status': make_column('Status', 'able_status', 'Picklist', options={'Open': 1, 'Closed': 2}),
+        'Location': make_column('Location', 'able_location', 'Lookup', schema_name='able_Location', related='able_location'),
+        'Visited On': make_column('Visited On', 'able_visitedon', 'DateTime'),
+        'Created On': make_column('Created On', 'createdon', 'DateTime', valid_for_create=False, valid_for_update=False),
+        'Report': make_column('Report', 'able_report', 'File')
+    })
+    entities.add_entity('Location', 'able_location', 'able_au', 'able_locations', {
+        'AU': make_column('AU', 'able_au', 'String')
+    })
+    return entities
+
+def make_api(session, entities: EntityDict) -> DataverseAPI:
+    """
+    Builds an API over a fake session without reading metadata from it.
+    """
+    api = DataverseAPI.__new__(DataverseAPI)
+    api.session = session
+    api.entities = entities
+    api.last_validation = None
+    return api
@@ -0,0 +1,67 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+import pytest
+import requests
+from dataverse._requests.fetchxml import build_aggregate_fetch
+from dataverse.query import Query
+
+def test_build_aggregate_fetch():
+    fetch = ET.fromstring(build_aggregate_fetch('account', [('industrycode', 'industry')], [('revenue', 'average', 'avg_revenue')],
+                                                [('statecode', 'eq', 0)]))
+    assert fetch.get('aggregate') == 'true'
+    assert fetch.find('entity/attribute[@alias="industry"]').get('groupby') == 'true'
+    assert fetch.find('entity/attribute[@alias="avg_revenue"]').get('aggregate') == 'avg'
+    assert fetch.find('entity/filter/condition').attrib == {'attribute': 'statecode', 'operator': 'eq', 'value': '0'}
+
+def test_apply(entities):
+    query = (Query(None, entities, entities.get_entity('Survey')).where('Amount', 'gt', 0).group_by('Status')
+             .aggregate('total', 'Amount', 'sum').count())
+    assert query.to_params() == {
+        '$apply': 'filter(able_amount gt 0)/groupby((able_status),aggregate(able_amount with sum as total,$count as count))'
+    }
+
+def test_apply_refuses_row_options(entities):
+    query = Query(None, entities, entities.get_entity('Survey')).count().top(5)
+    with pytest.raises(ValueError, match='cannot be combined'):
+        query.to_params()
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+class LimitedSession:
+    """
+    Serves FetchXML aggregates over at most limit rows, failing like Dataverse beyond that.
+    """
+    def __init__(self, rows: list, limit: int):
+        self.rows = rows
+        self.limit = limit
+        self.aggregate_queries = 0
+
+    def download(self, endpoint, params, sink=None):
+        raise requests.HTTPError('Error (400): AggregateQueryRecordLimit exceeded')
+
+    def query(self, endpoint, params):
+        if 'fetchXml' not in params:
+            ordered = sorted(self.rows, reverse='desc' in params['$orderby'])
+            return Response({'value': [{'createdon': ordered[0][0].strftime('%Y-%m-%dT%H:%M:%SZ')}]})
+
+        self.aggregate_queries += 1
+        conditions = {condition.get('operator'): condition.get('value') for condition in ET.fromstring(params['fetchXml']).iter('condition')}
+        start, end = (datetime.fromisoformat(conditions[operator].replace('Z', '+00:00')) for operator in ('ge', 'lt'))
+        rows = [status for created, status in self.rows if start <= created < end]
+        if len(rows) > self.limit:
+            raise requests.HTTPError('Error (400): AggregateQueryRecordLimit exceeded')
+        return Response({'value': [{'able_status': status, 'count': rows.count(status)} for status in set(rows)]})
+
+def test_split_aggregation_combines_parts(entities):
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [(first + timedelta(hours=hour), 1 if hour % 3 else 2) for hour in range(40)]
+    session = LimitedSession(rows, limit=8)
+
+    df = Query(session, entities, entities.get_entity('Survey')).group_by('Status').count().to_dataframe()
+    assert dict(zip(df['Status'], df['count'])) == {1: 26, 2: 14}
+    assert session.aggregate_queries > 1
@@ -0,0 +1,52 @@
+import json
+import pytest
+from dataverse._requests.batch import build_batch_body, get_boundary, parse_batch_response
+
+RESPONSE = (
+    '--batchresponse_1\r\n'
+    'Content-Type: application/http\r\n'
+    'Content-Transfer-Encoding: binary\r\n'
+    '\r\n'
+    'HTTP/1.1 204 No Content\r\n'
+    'OData-Version: 4.0\r\n'
+    'OData-EntityId: https://org.crm.dynamics.com/api/data/v9.2/accounts(00000000-0000-0000-0000-000000000001)\r\n'
+    '\r\n'
+    '\r\n'
+    '--batchresponse_1\r\n'
+    'Content-Type: application/http\r\n'
+    'Content-Transfer-Encoding: binary\r\n'
+    '\r\n'
+    'HTTP/1.1 400 Bad Request\r\n'
+    'Content-Type: application/json; odata.metadata=minimal\r\n'
+    'OData-Version: 4.0\r\n'
+    '\r\n'
+    '{"error":{"code":"0x0","message":"Bad value"}}\r\n'
+    '--batchresponse_1--\r\n'
+)
+
+def test_get_boundary():
+    assert get_boundary('multipart/mixed; boundary="batch_abc"') == 'batch_abc'
+    assert get_boundary('multipart/mixed;boundary=batchresponse_1') == 'batchresponse_1'
+
+def test_get_boundary_missing():
+    with pytest.raises(ValueError):
+        get_boundary('application/json')
+
+def test_parse_batch_response():
+    results = parse_batch_response('multipart/mixed; boundary=batchresponse_1', RESPONSE.encode('utf-8'))
+    assert [result['status_code'] for result in results] == [204, 400]
+    assert results[0]['headers']['OData-EntityId'].endswith('accounts(00000000-0000-0000-0000-000000000001)')
+    assert results[0]['body'] == ''
+    assert json.loads(results[1]['body'])['error']['message'] == 'Bad value'
+    assert results[1]['headers']['Content-Type'] == 'application/json; odata.metadata=minimal'
+
+def test_build_batch_body():
+    body = build_batch_body('batch_1', [
+        ('POST', '/api/data/v9.2/accounts', {'name': 'A'}),
+        ('DELETE', '/api/data/v9.2/accounts(1)', None)
+    ]).decode('utf-8')
+    parts = body.split('--batch_1')
+    assert len(parts) == 4 and parts[-1] == '--\r\n'
+    assert 'POST /api/data/v9.2/accounts HTTP/1.1\r\nContent-Type: application/json\r\n\r\n' in parts[1]
+    assert json.loads(parts[1].rsplit('\r\n\r\n', 1)[1]) == {'name': 'A'}
+    assert parts[2].endswith('DELETE /api/data/v9.2/accounts(1) HTTP/1.1\r\n\r\n')
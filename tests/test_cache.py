@@ -0,0 +1,97 @@
+import threading
+import requests
+from dataverse.cache import ReadCache, normalise_uri
+
+URI = 'https://example.crm.dynamics.com/api/data/v9.2/accounts'
+
+def make_response(status_code: int, body: bytes = b'', etag: str = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers['Content-Type'] = 'application/json'
+    if etag:
+        response.headers['ETag'] = etag
+    return response
+
+class GetSession:
+    """
+    Answers GETs with a numbered body and ETag, or 304 when If-None-Match matches the current ETag.
+    """
+    def __init__(self):
+        self.requests = []
+        self.version = 1
+        self.gate = None
+
+    def _send_get(self, uri, headers=None):
+        self.requests.append((uri, headers.get('If-None-Match')))
+        if self.gate is not None:
+            self.gate.wait(1)
+        etag = f'W/"{self.version}"'
+        if headers.get('If-None-Match') == etag:
+            return make_response(304)
+        return make_response(200, f'{{"version":{self.version}}}'.encode(), etag)
+
+def test_normalise_uri_sorts_options_and_keeps_prefer():
+    assert normalise_uri('HTTPS://Example.com/accounts?$top=1&$select=name') == 'https://example.com/accounts?%24select=name&%24top=1'
+    assert normalise_uri('https://example.com/accounts', {'Prefer': 'odata.maxpagesize=10'}).endswith('|odata.maxpagesize=10')
+
+def test_fresh_entries_are_served_without_a_request():
+    session = GetSession()
+    cache = ReadCache(max_age=60)
+    assert cache.get(session, URI).json() == {'version': 1}
+    assert cache.get(session, URI).json() == {'version': 1}
+    assert len(session.requests) == 1 and (cache.hits, cache.misses) == (1, 1)
+
+def test_stale_entries_are_revalidated_with_their_etag():
+    session = GetSession()
+    cache = ReadCache(max_age=0)
+    cache.get(session, URI)
+    assert cache.get(session, URI).json() == {'version': 1}
+    assert session.requests[1] == (URI, 'W/"1"')
+    assert cache.hits == 1
+
+    session.version = 2
+    assert cache.get(session, URI).json() == {'version': 2}
+    assert cache.misses == 2
+
+def test_no_cache_always_revalidates():
+    session = GetSession()
+    cache = ReadCache(max_age=60)
+    cache.get(session, URI)
+    cache.get(session, URI, {'Cache-Control': 'no-cache'})
+    assert len(session.requests) == 2
+
+def test_least_recently_used_entries_are_evicted():
+    session = GetSession()
+    cache = ReadCache(max_entries=2, max_age=60)
+    for uri in ('a', 'b', 'a', 'c'):
+        cache.get(session, f'{URI}/{uri}')
+    cache.get(session, f'{URI}/a')
+    cache.get(session, f'{URI}/b')
+    assert [uri.rsplit('/', 1)[1] for uri, _ in session.requests] == ['a', 'b', 'c', 'b']
+
+def test_identical_gets_share_one_request():
+    session = GetSession()
+    session.gate = threading.Event()
+    cache = ReadCache(max_age=60)
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(cache.get(session, URI).json())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while not session.requests:
+        pass
+    session.gate.set()
+    for thread in threads:
+        thread.join(1)
+    assert responses == [{'version': 1}] * 4
+    assert len(session.requests) == 1
+
+def test_entries_persist_on_disk(tmp_path):
+    session = GetSession()
+    ReadCache(max_age=60, directory=str(tmp_path)).get(session, URI)
+    cache = ReadCache(max_age=60, directory=str(tmp_path))
+    assert cache.get(session, URI).json() == {'version': 1}
+    assert len(session.requests) == 1
+
+    ReadCache(max_entries=1, max_age=60, directory=str(tmp_path)).get(session, f'{URI}/other')
+    assert len(list(tmp_path.iterdir())) == 1
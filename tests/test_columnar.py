@@ -0,0 +1,36 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dataverse import columnar
+
+def test_iter_batches_list_of_dicts():
+    rows = [{'a': 1}, {'b': 2}, {'a': 3, 'c': None}]
+    assert list(columnar.iter_batches(rows, 2)) == [({'a': [1, None], 'b': [None, 2]}, 2), ({'a': [3], 'c': [None]}, 1)]
+
+def test_iter_batches_dataframe():
+    df = pd.DataFrame({'n': pd.array([1, None, 3], dtype='Int64'), 'at': pd.to_datetime(['2024-01-02 03:04:05', None, '2024-05-06 00:00:00'])})
+    assert list(columnar.iter_batches(df, 2)) == [
+        ({'n': [1, None], 'at': ['2024-01-02T03:04:05Z', None]}, 2),
+        ({'n': [3], 'at': ['2024-05-06T00:00:00Z']}, 1)
+    ]
+
+def test_iter_batches_arrow_sources(tmp_path):
+    table = pa.table({'n': [1, 2, 3, 4, 5]})
+    expected = [({'n': [1, 2]}, 2), ({'n': [3, 4]}, 2), ({'n': [5]}, 1)]
+    assert list(columnar.iter_batches(table, 2)) == expected
+    assert list(columnar.iter_batches(table.to_batches()[0], 2)) == expected
+    assert list(columnar.iter_batches(table.to_batches(), 2)) == expected
+
+    path = str(tmp_path / 'rows.parquet')
+    pq.write_table(table, path)
+    assert [length for _, length in columnar.iter_batches(path, 2)] == [2, 2, 1]
+    assert [value for columns, _ in columnar.iter_batches(path, 2) for value in columns['n']] == [1, 2, 3, 4, 5]
+
+def test_arrow_values_conversions():
+    moment = datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    assert columnar.arrow_values(pa.array([moment, None], pa.timestamp('ms', 'UTC'))) == ['2024-01-02T03:04:05Z', None]
+    assert columnar.arrow_values(pa.array([date(2024, 2, 29)])) == ['2024-02-29']
+    assert columnar.arrow_values(pa.array(['a', None, 'b', 'a']).dictionary_encode()) == ['a', None, 'b', 'a']
+    assert columnar.arrow_values(pa.array([Decimal('1.25'), None], pa.decimal128(5, 2))) == [Decimal('1.25'), None]
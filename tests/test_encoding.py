@@ -0,0 +1,20 @@
+from decimal import Decimal
+import pytest
+from dataverse import encoding
+
+@pytest.fixture(params=['orjson', 'json'])
+def dumps(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(encoding, 'orjson', None)
+    elif encoding.orjson is None:
+        pytest.skip('orjson is not installed')
+    return encoding.dumps
+
+def test_decimals_are_written_as_exact_numbers(dumps):
+    data = dumps({'able_amount': Decimal('12345678901234.567891'), 'values': [Decimal('-1E+3'), 'text'], 'able_name': 'Café'})
+    assert data == '{"able_amount":12345678901234.567891,"values":[-1000,"text"],"able_name":"Café"}'.encode('utf-8')
+    assert encoding.loads(data)['values'] == [-1000, 'text']
+
+def test_unsupported_types_still_fail(dumps):
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
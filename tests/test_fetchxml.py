@@ -0,0 +1,42 @@
+import urllib.parse
+import xml.etree.ElementTree as ET
+from dataverse._requests.fetchxml import build_fetch, get_entity_name, get_paging_cookie, get_top, has_conditions, set_paging
+
+COOKIE = '<cookie page="1"><accountid last="{1}" first="{2}" /></cookie>'
+
+def test_get_paging_cookie_unquotes_twice():
+    annotation = f'<cookie pagenumber="2" pagingcookie="{urllib.parse.quote(urllib.parse.quote(COOKIE))}" istracking="False" />'
+    assert get_paging_cookie(annotation) == COOKIE
+
+def test_get_paging_cookie_missing():
+    assert get_paging_cookie('<cookie pagenumber="2" istracking="False" />') is None
+
+def test_set_paging():
+    fetch = ET.fromstring(set_paging('<fetch><entity name="account" /></fetch>', 2, 500, COOKIE))
+    assert (fetch.get('page'), fetch.get('count'), fetch.get('paging-cookie')) == ('2', '500', COOKIE)
+
+def test_set_paging_without_cookie():
+    fetch = ET.fromstring(set_paging('<fetch><entity name="account" /></fetch>', 1, 5000))
+    assert fetch.get('paging-cookie') is None
+
+def test_get_entity_name():
+    assert get_entity_name('<fetch><entity name="account"><attribute name="name" /></entity></fetch>') == 'account'
+
+def test_build_fetch():
+    fetch_xml = build_fetch('account', [('name', 'startswith', "O'Brien"), ('revenue', 'eq', None), ('active', 'eq', True)], ['accountid'])
+    entity = ET.fromstring(fetch_xml).find('entity')
+    assert get_entity_name(fetch_xml) == 'account'
+    assert [attribute.get('name') for attribute in entity.findall('attribute')] == ['accountid']
+    conditions = [condition.attrib for condition in entity.find('filter').findall('condition')]
+    assert conditions == [
+        {'attribute': 'name', 'operator': 'like', 'value': "O'Brien%"},
+        {'attribute': 'revenue', 'operator': 'null'},
+        {'attribute': 'active', 'operator': 'eq', 'value': '1'}
+    ]
+
+def test_has_conditions_and_top():
+    assert not has_conditions(build_fetch('account', []))
+    assert has_conditions('<fetch top="5"><entity name="account"><link-entity name="contact"><filter>'
+                          '<condition attribute="fullname" operator="eq" value="A" /></filter></link-entity></entity></fetch>')
+    assert get_top('<fetch top="5"><entity name="account" /></fetch>') == 5
+    assert get_top(build_fetch('account', [])) is None
@@ -0,0 +1,37 @@
+import pytest
+from dataverse import encoding
+from dataverse._requests import jobs
+
+class Response:
+    def __init__(self, data):
+        self.content = encoding.dumps(data)
+
+class JobSession:
+    def __init__(self, states: list):
+        self.states = states
+        self.polls = []
+
+    def query(self, endpoint, params=None, headers=None):
+        self.polls.append((endpoint, headers))
+        statecode, statuscode = self.states[min(len(self.polls), len(self.states)) - 1]
+        return Response({'statecode': statecode, 'statuscode': statuscode, 'message': None, 'friendlymessage': None})
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list:
+    sleeps = []
+    monkeypatch.setattr(jobs.time, 'sleep', sleeps.append)
+    return sleeps
+
+def test_wait_for_job_backs_off(sleeps):
+    session = JobSession([(0, 10), (2, 20), (2, 20), (2, 20), (3, 30)])
+    seen = []
+    job = jobs.wait_for_job(session, 'job', poll_interval=2, max_interval=5, progress=seen.append)
+    assert job['statuscode'] == 30
+    assert sleeps == [2, 4, 5, 5]
+    assert [job['statuscode'] for job in seen] == [10, 20, 20, 20, 30]
+    assert all(endpoint == 'asyncoperations(job)' and headers == jobs.NO_CACHE for endpoint, headers in session.polls)
+
+def test_wait_for_job_times_out(sleeps):
+    with pytest.raises(TimeoutError, match='In Progress'):
+        jobs.wait_for_job(JobSession([(2, 20)]), 'job', poll_interval=2, timeout=5)
+    assert sleeps == [2, 4]
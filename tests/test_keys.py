@@ -0,0 +1,20 @@
+from conftest import make_api
+
+class KeyedSession:
+    def mutate(self, entity_set_name, payloads, parse_response=True, minimal=False, sink=None, method='POST', keys=None, if_match=None):
+        self.request = (method, keys, if_match, payloads)
+        return [{'_REQUEST': {'HTTP_CONTENT': None}} for _ in payloads]
+
+def test_alternate_keys_are_quoted(entities):
+    session = KeyedSession()
+    make_api(session, entities).update('Survey', [{'Name': "O'Brien #1/2", 'Amount': 5}, {'Name': '100% & more?', 'Amount': 6}])
+    method, keys, if_match, payloads = session.request
+    assert (method, if_match) == ('PATCH', '*')
+    assert keys == ["able_name='O''Brien%20%231%2F2'", "able_name='100%25%20%26%20more%3F'"]
+    assert payloads == [{'able_amount': 5}, {'able_amount': 6}]
+
+def test_primary_ids_address_records(entities):
+    session = KeyedSession()
+    make_api(session, entities).upsert('Survey', [{'Survey': '00000000-0000-0000-0000-000000000001', 'Name': 'A'}], key='Survey')
+    method, keys, if_match, payloads = session.request
+    assert (keys, if_match) == (['00000000-0000-0000-0000-000000000001'], None)
@@ -0,0 +1,92 @@
+import errno
+import pytest
+from dataverse import locking
+from dataverse._requests import metadata
+from dataverse._requests.metadata import EntityDict, MetadataCache
+
+class FlakyMsvcrt:
+    """
+    Stands in for msvcrt, whose LK_LOCK gives up with EDEADLOCK while another process holds the lock.
+    """
+    LK_LOCK, LK_NBLCK, LK_UNLCK = 1, 2, 0
+
+    def __init__(self, timeouts: int):
+        self.timeouts = timeouts
+        self.calls = []
+
+    def locking(self, fileno, mode, size):
+        self.calls.append(mode)
+        if mode != self.LK_UNLCK and self.timeouts:
+            self.timeouts -= 1
+            raise OSError(errno.EDEADLOCK, 'Resource deadlock avoided')
+
+@pytest.fixture
+def msvcrt(monkeypatch):
+    msvcrt = FlakyMsvcrt(timeouts=2)
+    monkeypatch.setattr(locking, 'fcntl', None)
+    monkeypatch.setattr(locking, 'msvcrt', msvcrt, raising=False)
+    return msvcrt
+
+def test_blocking_acquire_retries_lock_timeouts(msvcrt, tmp_path):
+    lock = locking.FileLock(str(tmp_path / 'test.lock'))
+    assert lock.acquire()
+    assert msvcrt.calls == [msvcrt.LK_LOCK] * 3
+    lock.release()
+
+def test_non_blocking_acquire_gives_up(msvcrt, tmp_path):
+    assert not locking.FileLock(str(tmp_path / 'test.lock')).acquire(blocking=False)
+    assert msvcrt.calls == [msvcrt.LK_NBLCK]
+
+def test_get_raises_without_metadata(monkeypatch, tmp_path):
+    monkeypatch.setattr(metadata, 'download_entity_definitions', lambda session: (EntityDict(), []))
+    cache = MetadataCache('https://example.crm.dynamics.com', str(tmp_path))
+    with pytest.raises(ValueError, match='No entity metadata'):
+        cache.get(None)
+
+def test_lock_excludes_other_holders(tmp_path):
+    path = str(tmp_path / 'test.lock')
+    with locking.FileLock(path):
+        assert not locking.FileLock(path).acquire(blocking=False)
+    other = locking.FileLock(path)
+    assert other.acquire(blocking=False)
+    other.release()
+
+def test_write_json_atomic(tmp_path):
+    path = str(tmp_path / 'data.json')
+    locking.write_json_atomic(path, {'a': 1})
+    locking.write_json_atomic(path, {'a': 2})
+    assert open(path).read() == '{"a": 2}'
+    assert [file.name for file in tmp_path.iterdir()] == ['data.json']
+
+@pytest.fixture
+def downloads(monkeypatch, entities) -> list:
+    downloads = []
+
+    def download_entity_definitions(session):
+        downloads.append(session)
+        return entities, []
+
+    monkeypatch.setattr(metadata, 'download_entity_definitions', download_entity_definitions)
+    return downloads
+
+def test_metadata_is_downloaded_once_and_shared_through_the_file(downloads, tmp_path):
+    first = MetadataCache('https://example.crm.dynamics.com/', str(tmp_path))
+    entity_dict = first.get('session')
+    assert downloads == ['session']
+    assert first.get('session') is entity_dict
+
+    # another process starts from the cache file
+    second = MetadataCache('https://EXAMPLE.crm.dynamics.com', str(tmp_path))
+    assert second.entities_file == first.entities_file
+    assert second.get('session').get_entity('Survey').get_column('Status').options == {'Open': 1, 'Closed': 2}
+    assert downloads == ['session']
+
+    other = MetadataCache('https://other.crm.dynamics.com', str(tmp_path))
+    assert other.entities_file != first.entities_file and not other.is_current()
+
+def test_stale_metadata_is_refreshed_in_place(downloads, tmp_path):
+    cache = MetadataCache('https://example.crm.dynamics.com', str(tmp_path), max_age_hours=0)
+    entity_dict = cache.get('session')
+    cache.refresh('session')
+    assert len(downloads) == 2
+    assert cache.entity_dict is entity_dict
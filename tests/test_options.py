@@ -0,0 +1,25 @@
+from conftest import make_api
+from dataverse._requests.metadata import MetadataCache, get_environment_key
+
+class OptionSession:
+    environmentURI = 'https://example.crm.dynamics.com'
+
+    def batch(self, operations, batch_size=1000, sink=None):
+        self.operations = operations
+        return [{'row': row, 'status_code': 200 if payload['Label']['UserLocalizedLabel']['Label'] != 'Bad' else 400,
+                 'content': {'NewOptionValue': 3} if action == 'InsertOptionValue' else None,
+                 'error': 'Bad label' if payload['Label']['UserLocalizedLabel']['Label'] == 'Bad' else None}
+                for row, (_, action, payload) in enumerate(operations)]
+
+def test_saved_options_reach_the_metadata_cache_file(entities, monkeypatch, tmp_path):
+    session = OptionSession()
+    cache = MetadataCache(session.environmentURI, str(tmp_path))
+    monkeypatch.setitem(MetadataCache._instances, get_environment_key(session.environmentURI), cache)
+
+    make_api(session, entities).upsert_options('Survey', 'Status', [{'Label': 'Open'}, {'Label': 'Pending'}, {'Label': 'Bad'}])
+    assert [action for _, action, _ in session.operations] == ['UpdateOptionValue', 'InsertOptionValue', 'InsertOptionValue']
+    assert entities.get_entity('Survey').get_column('Status').options == {'Open': 1, 'Closed': 2, 'Pending': 3}
+
+    # a new process reads the saved options from the cache file
+    reloaded = MetadataCache(session.environmentURI, str(tmp_path))._read()
+    assert reloaded.get_entity('Survey').get_column('Status').options == {'Open': 1, 'Closed': 2, 'Pending': 3}
@@ -0,0 +1,98 @@
+import threading
+import uuid
+from dataverse.pool import SessionPool
+from dataverse.results import MutateResult
+from dataverse.throttle import ThrottleState
+
+class ChunkSession:
+    """
+    Creates a record per payload, failing payloads marked bad, and remembers every chunk it was sent.
+    """
+    environmentURI = 'https://example.crm.dynamics.com'
+
+    def __init__(self, name: str):
+        self.name = name
+        self.throttle = ThrottleState()
+        self.chunks = []
+        self._lock = threading.Lock()
+
+    def build_uri(self, endpoint, query_params=None):
+        return f'{self.environmentURI}/api/data/v9.2/{endpoint}'
+
+    def mutate(self, entity_set_name, payloads, parse_response=True, minimal=False, sink=None, method='POST', keys=None,
+               if_match=None, progress=True):
+        with self._lock:
+            self.chunks.append((len(payloads), progress))
+        result = MutateResult(self.build_uri(entity_set_name))
+        for payload in payloads:
+            if payload.get('bad'):
+                result.append(400, error='Bad row')
+            else:
+                result.append(204, str(uuid.UUID(int=payload['n'])))
+        return result
+
+def test_pool_reports_progress_once(capsys):
+    sessions = [ChunkSession('a'), ChunkSession('b')]
+    payloads = [{'n': n + 1, 'bad': n == 3} for n in range(10)]
+    result = SessionPool(sessions, concurrency=2).mutate('accounts', payloads, minimal=True, chunk_size=4)
+
+    assert [chunk for session in sessions for chunk in session.chunks if chunk[1]] == []
+    assert sorted(size for session in sessions for size, _ in session.chunks) == [2, 4, 4]
+    assert result.ids == [None if n == 3 else str(uuid.UUID(int=n + 1)) for n in range(10)]
+    assert result.errors == {3: 'Bad row'}
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:3] == ['40.0% complete', '80.0% complete', '100.0% complete']
+    assert lines[3] == '9 UPDATES MADE OF 10 EXPECTED UPDATES. 1 FAILURES.'
+
+def test_pool_progress_can_be_silenced(capsys):
+    SessionPool([ChunkSession('a')]).mutate('accounts', [{'n': 1}], minimal=True, progress=False)
+    assert capsys.readouterr().out == ''
+
+class Response:
+    def __init__(self, status_code: int, headers: dict):
+        self.status_code = status_code
+        self.headers = headers
+
+def test_throttle_state_tracks_budget(monkeypatch):
+    throttle = ThrottleState()
+    assert throttle.budget() == float('inf')
+    throttle.update(Response(200, {'x-ms-ratelimit-burst-remaining-xrm-requests': '42',
+                                   'x-ms-ratelimit-time-remaining-xrm-requests': '1200.5'}))
+    assert (throttle.burst_remaining, throttle.time_remaining, throttle.budget()) == (42, 1200.5, 42)
+
+    now = [1000.0]
+    monkeypatch.setattr('dataverse.throttle.time.monotonic', lambda: now[0])
+    sleeps = []
+    monkeypatch.setattr('dataverse.throttle.time.sleep', sleeps.append)
+    throttle.update(Response(429, {'Retry-After': '30'}))
+    assert throttle.paused and throttle.budget() == float('-inf') and throttle.throttled == 1
+    throttle.wait()
+    assert sleeps == [30.0]
+    now[0] += 30
+    assert not throttle.paused and throttle.budget() == 42
+
+def test_acquire_prefers_the_largest_budget():
+    sessions = [ChunkSession('a'), ChunkSession('b'), ChunkSession('c')]
+    sessions[0].throttle.burst_remaining = 10
+    sessions[1].throttle.burst_remaining = 500
+    sessions[2].throttle.burst_remaining = 100
+    pool = SessionPool(sessions, concurrency=1)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert (first.name, second.name) == ('b', 'c')
+    pool.release(first)
+    assert pool.acquire() is first
+
+def test_acquire_waits_for_a_free_slot():
+    pool = SessionPool([ChunkSession('a')], concurrency=1)
+    held = pool.acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.1)
+    assert acquired == []
+    pool.release(held)
+    waiter.join(1)
+    assert acquired == [held]
@@ -0,0 +1,46 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from dataverse.query import Query, format_value
+
+def make_query(entities, session=None) -> Query:
+    return Query(session, entities, entities.get_entity('Survey'))
+
+def test_format_value():
+    assert format_value(None) == 'null'
+    assert format_value(True) == 'true'
+    assert format_value(12.5) == '12.5'
+    assert format_value("O'Neil") == "'O''Neil'"
+
+def test_to_params(entities):
+    query = (make_query(entities).select('Name', 'Location').where('Amount', 'gt', 100).where('Name', 'contains', 'Care')
+             .expand('Location', 'AU').order_by('Amount', descending=True).top(10))
+    assert query.to_params() == {
+        '$select': 'able_name,_able_location_value',
+        '$filter': "able_amount gt 100 and contains(able_name,'Care')",
+        '$expand': 'able_Location($select=able_au)',
+        '$orderby': 'able_amount desc',
+        '$top': '10'
+    }
+
+def test_where_converts_choice_labels_and_leaves_lookups_unquoted(entities):
+    params = make_query(entities).where('Status', 'eq', 'Closed').where('Location', 'eq', '00000000-0000-0000-0000-000000000001').to_params()
+    assert params['$filter'] == 'able_status eq 2 and _able_location_value eq 00000000-0000-0000-0000-000000000001'
+
+def test_where_formats_dates_in_utc(entities):
+    query = (make_query(entities).where('Visited On', 'ge', datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=10))))
+             .where('Visited On', 'lt', date(2024, 2, 1)).where('Name', 'eq', datetime(2024, 1, 1)))
+    assert query.to_params()['$filter'] == "able_visitedon ge 2024-01-01T00:00:00Z and able_visitedon lt 2024-02-01 and able_name eq '2024-01-01T00:00:00Z'"
+
+def test_where_rejects_unknown_operators(entities):
+    with pytest.raises(ValueError, match='Unsupported operator'):
+        make_query(entities).where('Amount', 'between', 1)
+
+def test_fetch_follows_the_session(entities):
+    class Session:
+        def download(self, endpoint, params, sink=None):
+            self.request = (endpoint, params)
+            return [{'able_name': 'A'}]
+
+    session = Session()
+    assert make_query(entities, session).select('Name').fetch() == [{'able_name': 'A'}]
+    assert session.request == ('able_surveies', {'$select': 'able_name'})
@@ -0,0 +1,49 @@
+from decimal import Decimal
+import pandas as pd
+import pytest
+from dataverse import readers
+from dataverse._requests.metadata import ColumnDef
+
+def make_column(attribute_type: str, options: dict = None) -> ColumnDef:
+    return ColumnDef(display_name='Column', logical_name='column', schema_name='Column', attribute_type=attribute_type, options=options)
+
+def strings(*values) -> pd.Series:
+    return pd.Series(values, dtype='string')
+
+def test_coerce_options_labels_and_values():
+    column = make_column('Picklist', {'Open': 1, 'Closed': 2})
+    assert readers.coerce_column(strings('Open', ' Closed ', '2', None), column).tolist() == [1, 2, 2, pd.NA]
+
+def test_coerce_options_unknown_label():
+    with pytest.raises(KeyError, match='Pending'):
+        readers.coerce_column(strings('Open', 'Pending'), make_column('Picklist', {'Open': 1}))
+
+def test_coerce_boolean():
+    assert readers.coerce_column(strings('Yes', ' true', '0', None), make_column('Boolean')).tolist() == [True, True, False, pd.NA]
+
+def test_coerce_boolean_rejects_unknown_values():
+    with pytest.raises(ValueError, match="'Y', 'on'"):
+        readers.coerce_column(strings('Y', 'on', 'no'), make_column('Boolean'))
+
+def test_coerce_money():
+    values = readers.coerce_column(strings('$100.00 ', '(50.00)', '$1,100.50', '-$3', '12 EUR', '.5', None), make_column('Money'))
+    assert values.tolist() == [Decimal('100.00'), Decimal('-50.00'), Decimal('1100.50'), Decimal('-3'), Decimal('12'), Decimal('0.5'), None]
+
+@pytest.mark.parametrize('value', ['1.100,50', '1,10', '(5', '12abc34'])
+def test_coerce_money_rejects_ambiguous_values(value):
+    with pytest.raises(ValueError, match='Money'):
+        readers.coerce_column(strings(value), make_column('Money'))
+
+def test_coerce_decimal_keeps_every_digit():
+    values = readers.coerce_column(strings(' 12345678901234.567891', '-1E+3', None), make_column('Decimal'))
+    assert values.tolist() == [Decimal('12345678901234.567891'), Decimal('-1E+3'), None]
+    with pytest.raises(ValueError, match="'NaN', 'ten'"):
+        readers.coerce_column(strings('NaN', 'ten'), make_column('Decimal'))
+
+def test_coerce_datetime_to_utc():
+    values = readers.coerce_column(strings('2024-01-02T10:00:00+10:00', '2024-01-01T14:00:00Z'), make_column('DateTime'))
+    assert values.tolist() == ['2024-01-02T00:00:00Z', '2024-01-01T14:00:00Z']
+
+def test_to_records_uses_none_for_missing():
+    df = pd.DataFrame({'a': pd.Series([1, None], dtype='Int64'), 'b': strings('x', None)})
+    assert readers.to_records(df) == [{'a': 1, 'b': 'x'}, {'a': None, 'b': None}]
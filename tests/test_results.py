@@ -0,0 +1,51 @@
+from dataverse.results import MutateResult, entity_id_from_uri
+
+FIRST_ID = '00000000-0000-0000-0000-000000000001'
+SECOND_ID = '6e085242-1802-4df0-9ff3-02b3847d951a'
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+def test_append_packs_ids_and_errors():
+    result = MutateResult('accounts')
+    result.append(204, FIRST_ID)
+    result.append(400, error='Bad value')
+    result.append(204, SECOND_ID)
+    assert list(result.status_codes) == [204, 400, 204]
+    assert len(result._ids) == 48
+    assert result.ids == [FIRST_ID, None, SECOND_ID]
+    assert result.errors == {1: 'Bad value'}
+    assert (len(result), result.successes, result.failures) == (3, 2, 1)
+
+def test_extend_offsets_errors():
+    first = MutateResult('accounts')
+    first.append(204, FIRST_ID)
+    second = MutateResult('accounts')
+    second.append(412, error='Missing')
+    second.append(204, SECOND_ID)
+    first.extend(second)
+    assert first.ids == [FIRST_ID, None, SECOND_ID]
+    assert first.errors == {1: 'Missing'}
+
+def test_write_to_with_offset_and_index():
+    result = MutateResult('accounts')
+    result.append(204, FIRST_ID)
+    result.append(400, error='Bad value')
+    sink = ListSink()
+    result.write_to(sink, 10)
+    assert [record['row'] for record in sink.records] == [10, 11]
+    sink = ListSink()
+    result.write_to(sink, 1, [0, 2, 5])
+    assert sink.records == [
+        {'row': 2, 'status_code': 204, 'id': FIRST_ID, 'error': None},
+        {'row': 5, 'status_code': 400, 'id': None, 'error': 'Bad value'}
+    ]
+
+def test_entity_id_from_uri():
+    assert entity_id_from_uri(f'https://org.crm.dynamics.com/api/data/v9.2/accounts({FIRST_ID})') == FIRST_ID
+    assert entity_id_from_uri(None) is None
+    assert entity_id_from_uri('https://org.crm.dynamics.com/api/data/v9.2/accounts') is None
@@ -0,0 +1,57 @@
+import csv
+import json
+import pyarrow.parquet as pq
+import pytest
+from dataverse import sinks
+
+RECORDS = [
+    {'row': 0, 'status_code': 204, 'id': '00000000-0000-0000-0000-000000000001', 'error': None},
+    {'row': 1, 'status_code': 400, 'id': None, 'error': 'Bad value'}
+]
+
+def test_json_lines_sink(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    with sinks.open_sink(path) as sink:
+        sink.write_many(RECORDS)
+    assert [json.loads(line) for line in open(path)] == RECORDS
+    assert sink.rows_written == 2
+
+def test_csv_sink_takes_its_header_from_the_first_record(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    with sinks.open_sink(path) as sink:
+        sink.write_many(RECORDS)
+        sink.write({**RECORDS[0], 'extra': 'ignored'})
+    rows = list(csv.DictReader(open(path, newline='')))
+    assert list(rows[0]) == ['row', 'status_code', 'id', 'error']
+    assert [row['error'] for row in rows] == ['', 'Bad value', '']
+
+def test_sink_flushes_every_flush_every_records(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    sink = sinks.JsonLinesSink(path, flush_every=2)
+    sink.write_many(RECORDS)
+    sink.write(RECORDS[0])
+    # the first two records reached the file before the sink was closed
+    assert len(open(path).readlines()) == 2
+    sink.close()
+    assert len(open(path).readlines()) == 3
+
+def test_parquet_sink_with_schema(tmp_path):
+    path = str(tmp_path / 'results.parquet')
+    # the first row group has no errors, which the schema still types as strings
+    with sinks.ParquetSink(path, flush_every=1, schema=sinks.RESULT_SCHEMA) as sink:
+        sink.write_many(RECORDS)
+    table = pq.read_table(path)
+    assert str(table.schema.field('status_code').type) == 'int32'
+    assert table.to_pylist() == RECORDS
+    assert pq.ParquetFile(path).metadata.num_row_groups == 2
+
+def test_parquet_sink_infers_empty_fields_as_strings(tmp_path):
+    path = str(tmp_path / 'results.parquet')
+    with sinks.open_sink(path, flush_every=1) as sink:
+        sink.write_many(RECORDS)
+    assert str(pq.read_table(path).schema.field('error').type) == 'string'
+    assert pq.read_table(path).column('error').to_pylist() == [None, 'Bad value']
+
+def test_open_sink_rejects_unknown_extensions(tmp_path):
+    with pytest.raises(ValueError, match="'.xlsx'"):
+        sinks.open_sink(str(tmp_path / 'results.xlsx'))
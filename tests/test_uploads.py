@@ -0,0 +1,62 @@
+import uuid
+import pytest
+from conftest import make_api
+from dataverse.results import MutateResult
+
+IDS = [str(uuid.UUID(int=row + 1)) for row in range(3)]
+
+class CreatingSession:
+    def __init__(self):
+        self.created = 0
+
+    def build_uri(self, endpoint):
+        return endpoint
+
+    def mutate(self, entity_set_name, payloads, parse_response=True, minimal=False, sink=None, method='POST', keys=None, if_match=None):
+        if minimal:
+            result = MutateResult(entity_set_name)
+            for _ in payloads:
+                result.append(204, IDS[self.created])
+                self.created += 1
+            return result
+        for payload in payloads:
+            payload['_REQUEST'] = {'HTTP_RESPONSE': 201, 'HTTP_CONTENT': {'able_surveyid': IDS[self.created]}}
+            self.created += 1
+        return payloads
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def flush(self):
+        pass
+
+@pytest.fixture
+def api(entities):
+    api = make_api(CreatingSession(), entities)
+    uploads = []
+
+    def upload_file(display_name, record_id, column_name, path):
+        if path == 'missing.pdf':
+            raise FileNotFoundError(f"No such file: '{path}'")
+        uploads.append((record_id, path))
+
+    api.upload_file = upload_file
+    api.uploads = uploads
+    return api
+
+ROWS = [{'Name': 'A', 'Report': 'a.pdf'}, {'Name': 'B', 'Report': 'missing.pdf'}, {'Name': 'C', 'Report': 'c.pdf'}]
+
+def test_failed_upload_is_recorded_on_its_row(api):
+    sink = api.create('Survey', ROWS, sink=ListSink(), batch_size=2)
+    assert [record['id'] for record in sink.records] == IDS
+    assert [record['error'] for record in sink.records] == [None, "Uploading 'Report' failed: No such file: 'missing.pdf'", None]
+    assert api.uploads == [(IDS[0], 'a.pdf'), (IDS[2], 'c.pdf')]
+
+def test_failed_upload_in_parsed_results(api):
+    results = api.create('Survey', [dict(row) for row in ROWS])
+    assert [result['_REQUEST'].get('UPLOAD_ERROR') for result in results] == [None, "Uploading 'Report' failed: No such file: 'missing.pdf'", None]
+    assert 'able_report' not in results[0]
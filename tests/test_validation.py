@@ -0,0 +1,72 @@
+import pandas as pd
+from dataverse import validation
+from conftest import make_api
+
+class RecordingSession:
+    def __init__(self):
+        self.payloads = []
+
+    def mutate(self, entity_set_name, payloads, parse_response=True, minimal=False, sink=None, method='POST', keys=None, if_match=None):
+        self.payloads += payloads
+        return [{'_REQUEST': {'HTTP_CONTENT': None}} for _ in payloads]
+
+def test_unknown_columns_are_dropped_from_valid_rows(entities):
+    df = pd.DataFrame({'Name': ['A', 'B'], 'Colour': ['red', None], 'Notes': [None, None]})
+    report = validation.validate(df, entities.get_entity('Survey'), entities)
+    assert report.rejections[['row', 'column']].values.tolist() == [[0, 'Colour']]
+    assert report.valid.columns.tolist() == ['Name']
+    assert report.valid['Name'].tolist() == ['B']
+
+def test_validated_create_skips_unknown_columns(entities):
+    session = RecordingSession()
+    make_api(session, entities).create('Survey', [{'Name': 'A', 'Notes': None}, {'Name': 'B', 'Notes': None}], validate=True)
+    assert session.payloads == [{'able_name': 'A'}, {'able_name': 'B'}]
+
+def reasons(report) -> list:
+    return sorted(report.rejections[['row', 'reason']].itertuples(index=False, name=None))
+
+def test_validate_checks_each_column(entities):
+    df = pd.DataFrame({
+        'Name': ['Short', 'Far too long a name', None, 'Ok'],
+        'Amount': [10, 2000, 'ten', None],
+        'Created On': [None, None, None, '2024-01-01']
+    })
+    report = validation.validate(df, entities.get_entity('Survey'), entities)
+    assert reasons(report) == [
+        (1, 'Greater than the maximum of 1000'),
+        (1, 'Longer than 10 characters'),
+        (2, "Column 'Name' is required"),
+        (2, 'Not a number'),
+        (3, "Column 'Created On' cannot be set on create")
+    ]
+    assert report.valid.index.tolist() == [0]
+    assert report.rejected_rows == 3
+
+def test_validate_missing_required_column_rejects_every_row(entities):
+    report = validation.validate(pd.DataFrame({'Amount': [1, 2]}), entities.get_entity('Survey'), entities)
+    assert reasons(report) == [(0, "Required column 'Name' is missing"), (1, "Required column 'Name' is missing")]
+    assert report.valid.empty
+
+def test_validate_update(entities):
+    entity = entities.get_entity('Survey')
+    df = pd.DataFrame({'Survey': ['a', None], 'Amount': [1, 2]})
+    report = validation.validate(df, entity, entities, operation='update', key_column=entity.get_column('Survey'))
+    # required columns may be left out of an update, and the key column is only checked for values
+    assert reasons(report) == [(1, "Key column 'Survey' is empty")]
+
+class LookupSession:
+    def __init__(self, keys: list):
+        self.keys = keys
+        self.requests = []
+
+    def download(self, endpoint, params):
+        self.requests.append((endpoint, params))
+        return [{'able_au': key} for key in self.keys]
+
+def test_validate_lookups(entities):
+    session = LookupSession(['AU1'])
+    df = pd.DataFrame({'Name': ['A', 'B', 'C'], 'Location': ['AU1', 'AU2', 'AU1']})
+    report = validation.validate(df, entities.get_entity('Survey'), entities, session)
+    assert reasons(report) == [(1, "No 'Location' record with this key")]
+    endpoint, params = session.requests[0]
+    assert len(session.requests) == 1 and endpoint == 'able_locations' and params['$select'] == 'able_au'